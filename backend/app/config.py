@@ -9,15 +9,82 @@ class Settings:
     GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "https://swiftmail-backend-ty9c.onrender.com//api/auth/callback")
     
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") 
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+    GEMINI_LIGHT_MODEL = os.getenv("GEMINI_LIGHT_MODEL", "gemini-2.5-flash-lite")
+
+    # Model cascade thresholds (characters of email body)
+    SUMMARY_EXTRACT_MAX_CHARS = int(os.getenv("SUMMARY_EXTRACT_MAX_CHARS", "200"))
+    LIGHT_MODEL_MAX_CHARS = int(os.getenv("LIGHT_MODEL_MAX_CHARS", "2000"))
+    LIGHT_MODEL_MAX_QUOTED_REPLIES = int(os.getenv("LIGHT_MODEL_MAX_QUOTED_REPLIES", "1"))
+
+    # LLM dispatch: per-worker ceiling on concurrent Gemini calls, and the share bulk summaries may use
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_BULK_MAX_CONCURRENCY = int(os.getenv("LLM_BULK_MAX_CONCURRENCY", "6"))
+
+    # Request deadlines and hedged upstream calls
+    REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "25"))
+    SUMMARY_MIN_BUDGET_SECONDS = float(os.getenv("SUMMARY_MIN_BUDGET_SECONDS", "2"))
+    HEDGE_LATENCY_WINDOW = int(os.getenv("HEDGE_LATENCY_WINDOW", "500"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+    GMAIL_FETCH_CONCURRENCY = int(os.getenv("GMAIL_FETCH_CONCURRENCY", "10"))
+
+    # Admin-only profiling (disabled unless ADMIN_TOKEN is set)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "data/profiles")
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+    LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+    LOOP_BLOCK_MONITOR = os.getenv("LOOP_BLOCK_MONITOR", "false").lower() == "true"
+
+    # Read triage: only the top-K scored emails are summarized by the LLM
+    TRIAGE_SUMMARY_TOP_K = int(os.getenv("TRIAGE_SUMMARY_TOP_K", "10"))
+    TRIAGE_FREQUENT_SENDER_COUNT = int(os.getenv("TRIAGE_FREQUENT_SENDER_COUNT", "20"))
+    TRIAGE_CACHE_TTL_SECONDS = int(os.getenv("TRIAGE_CACHE_TTL_SECONDS", "3600"))
+    TRIAGE_CACHE_SIZE = int(os.getenv("TRIAGE_CACHE_SIZE", "20000"))
+
+    # Near-duplicate grouping of read results (64-bit SimHash; unrelated texts average 32 bits apart)
+    DEDUP_SIMHASH_MAX_DISTANCE = int(os.getenv("DEDUP_SIMHASH_MAX_DISTANCE", "10"))
+    DEDUP_MIN_TOKENS = int(os.getenv("DEDUP_MIN_TOKENS", "8"))
+    DEDUP_RECENT_SUMMARIES = int(os.getenv("DEDUP_RECENT_SUMMARIES", "200"))
+    DEDUP_RECENT_USERS = int(os.getenv("DEDUP_RECENT_USERS", "1000"))
+
+    # Semantic search over fetched mail
+    GEMINI_EMBEDDING_MODEL = os.getenv("GEMINI_EMBEDDING_MODEL", "gemini-embedding-001")
+    EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_MAX_CHARS = int(os.getenv("EMBEDDING_MAX_CHARS", "2000"))
+    VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "data/vector_index")
+    # Cosine floor for semantic fallback hits. gemini-embedding-001 scores are compressed:
+    # unrelated mail often lands around 0.5-0.6, so this only drops clearly unrelated hits
+    # and does not prove a match. Delete/reply confirmations therefore show the matched
+    # sender and subject; raise this for a stricter fallback that misses more paraphrases.
+    SEMANTIC_SEARCH_MIN_SCORE = float(os.getenv("SEMANTIC_SEARCH_MIN_SCORE", "0.55"))
+
+    # Outbox: replies are persisted and sent by a background worker
+    REPLY_METADATA_CACHE_SIZE = int(os.getenv("REPLY_METADATA_CACHE_SIZE", "5000"))
+    OUTBOX_POLL_INTERVAL_SECONDS = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1.0"))
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+    OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "2.0"))
+    OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "300.0"))
+
+    # Last listing per session, for "reply to the 3rd one"
+    SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", "1800"))
+    SESSION_CACHE_MAX_EMAILS = int(os.getenv("SESSION_CACHE_MAX_EMAILS", "50"))
     
     SECRET_KEY = os.getenv("SECRET_KEY", "your-long-secure-session-key-change-this")
     
     MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "ai_assistant_db")
     MONGO_COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "user_tokens")
+    MONGO_OUTBOX_COLLECTION_NAME = os.getenv("MONGO_OUTBOX_COLLECTION_NAME", "outbox")
+    MONGO_SESSION_CACHE_COLLECTION_NAME = os.getenv("MONGO_SESSION_CACHE_COLLECTION_NAME", "session_listings")
 
     FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+    COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+
     GMAIL_SCOPES = [
         'https://www.googleapis.com/auth/gmail.readonly',
         'https://www.googleapis.com/auth/gmail.send',
@@ -1,5 +1,6 @@
-from fastapi import Request, Depends, HTTPException, status
+from fastapi import Request, Depends, Header, HTTPException, status
 from app.services.auth_service import load_and_refresh_tokens
+from app.services.profiling_service import is_admin_token
 
 def get_session_id(request: Request) -> str:
     """Extracts the session ID from the request session."""
@@ -8,6 +9,10 @@ def get_session_id(request: Request) -> str:
         return None
     return session_id
 
+def get_user_id(request: Request, session_id: str = Depends(get_session_id)) -> str:
+    """Stable per-user key for local state. Falls back to the session ID for sessions created before login stored the email."""
+    return request.session.get("user_email") or session_id
+
 async def get_current_user_credentials(request: Request, session_id: str = Depends(get_session_id)):
     """
     Loads and refreshes Google credentials from the database.
@@ -30,4 +35,9 @@ async def get_current_user_credentials(request: Request, session_id: str = Depen
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return creds_data
\ No newline at end of file
+    return creds_data
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Guards operator endpoints. Responds 404 so they are invisible without a valid ADMIN_TOKEN."""
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
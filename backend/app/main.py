@@ -1,14 +1,21 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from brotli_asgi import BrotliMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.config import settings
-from app.routers import auth, chat 
+from app.routers import admin, auth, chat, metrics
+from app.services import outbox_service, profiling_service, session_cache_service
+from app.services.deadline_service import DeadlineMiddleware
+from app.services.profiling_service import ProfilingMiddleware
 
 app = FastAPI(
     title="Constructure AI Email Assistant",
-    description="A mini-AI powered email assistant built with FastAPI and React."
+    description="A mini-AI powered email assistant built with FastAPI and React.",
+    default_response_class=ORJSONResponse
 )
 
 origins = [
@@ -25,6 +32,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli for clients that accept it, gzip otherwise. Small payloads are sent as-is.
+app.add_middleware(
+    BrotliMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    gzip_fallback=True
+)
+
+# Gives each request a time budget that Gmail and Gemini calls observe (see deadline_service).
+app.add_middleware(DeadlineMiddleware)
+
+# Admin-only: X-Admin-Token plus X-Profile: 1 (or ?profile=1) runs the request under cProfile.
+app.add_middleware(ProfilingMiddleware)
+
 app.add_middleware(
     SessionMiddleware, 
     secret_key=settings.SECRET_KEY,
@@ -37,14 +57,26 @@ async def startup_db_client():
     app.mongodb_client = AsyncIOMotorClient(settings.MONGO_URI)
     app.mongodb = app.mongodb_client[settings.MONGO_DB_NAME]
     print("Connected to MongoDB!")
+    try:
+        await session_cache_service.ensure_indexes(app.mongodb)
+    except Exception as e:
+        print(f"Warning: could not create session cache indexes: {e}")
+    app.outbox_sender = asyncio.create_task(outbox_service.run_sender(app.mongodb))
+    if settings.LOOP_BLOCK_MONITOR:
+        profiling_service.loop_monitor.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    app.outbox_sender.cancel()
+    profiling_service.loop_monitor.stop()
+    profiling_service.stack_sampler.stop()
     app.mongodb_client.close()
     print("Closed MongoDB connection.")
 
 app.include_router(auth.router)
 app.include_router(chat.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 @app.get("/")
 def read_root():
@@ -1,10 +1,16 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 
+EmailField = Literal["id", "sender", "subject", "body", "snippet", "summary", "date", "thread_id", "triage"]
+
 class CommandRequest(BaseModel):
     """Schema for the user's input command."""
     command: str = Field(..., description="The natural language command from the user.")
+    fields: Optional[List[EmailField]] = Field(
+        None,
+        description="Email fields to include in read results. Omit for all fields; bodies can be fetched per message."
+    )
 
 class EmailData(BaseModel):
     """Schema for a single email item returned to the frontend."""
@@ -13,7 +19,10 @@ class EmailData(BaseModel):
     subject: str
     body: str = Field(..., description="Full email body content.")
     snippet: str
-    summary: str = Field(..., description="AI-generated summary (Part 3.1).")
+    date: int = Field(0, description="Gmail internalDate, in milliseconds since the epoch.")
+    thread_id: Optional[str] = None
+    summary: str = Field(..., description="AI-generated summary (Part 3.1), or the snippet for low-priority mail.")
+    triage: Optional[dict] = Field(None, description="Triage score, reasons, and whether the summary came from the LLM.")
     
 class ChatResponse(BaseModel):
     """Schema for the AI Assistant's response to the frontend."""
@@ -32,6 +41,7 @@ class IntentParams(BaseModel):
     subject_keyword: Optional[str] = None
     email_number: Optional[int] = None
     reply_content: Optional[str] = None
+    within_days: Optional[int] = None
 
 class AIIntent(BaseModel):
     action: str = Field(..., enum=["read", "respond", "delete", "unknown"])
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.config import settings
+from app.dependencies import require_admin
+from app.services import profiling_service
+
+router = APIRouter(
+    prefix="/api/admin/profiling",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin)]
+)
+
+@router.post("/sampling/start")
+async def start_sampling(duration: float = 30, interval_ms: float = 10):
+    """Starts a time-boxed stack sampling session covering every thread of this worker."""
+    duration = min(max(duration, 1), settings.PROFILE_MAX_SECONDS)
+    interval_ms = max(interval_ms, 1)
+    if not profiling_service.stack_sampler.start(duration, interval_ms / 1000):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A sampling session is already running on this worker.")
+    return profiling_service.stack_sampler.status()
+
+@router.post("/sampling/stop")
+async def stop_sampling():
+    """Stops the current sampling session early and writes its output."""
+    profiling_service.stack_sampler.stop()
+    return profiling_service.stack_sampler.status()
+
+@router.get("/sampling")
+async def get_sampling_status():
+    return profiling_service.stack_sampler.status()
+
+@router.post("/blocking/start")
+async def start_blocking_monitor():
+    """Starts recording event-loop stalls longer than LOOP_BLOCK_THRESHOLD_MS, with the blocking stack."""
+    profiling_service.loop_monitor.start()
+    return profiling_service.loop_monitor.status()
+
+@router.post("/blocking/stop")
+async def stop_blocking_monitor():
+    profiling_service.loop_monitor.stop()
+    return profiling_service.loop_monitor.status()
+
+@router.get("/blocking")
+async def get_blocking_events():
+    return profiling_service.loop_monitor.status()
+
+@router.get("/profiles")
+async def list_profiles():
+    """Lists request profiles (.pstats) and sampling outputs (.collapsed), newest first."""
+    return {"profiles": profiling_service.list_profiles()}
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, format: str = "raw"):
+    """Downloads a profile. format=text renders a .pstats profile as a cumulative-time table."""
+    path = profiling_service.profile_path(name)
+    if not path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found.")
+    if format == "text" and name.endswith(".pstats"):
+        return PlainTextResponse(profiling_service.pstats_as_text(path))
+    return FileResponse(path, filename=name, media_type="application/octet-stream")
@@ -32,6 +32,7 @@ async def google_auth_callback(request: Request, code: str = None, state: str =
         
         session_id = await auth_service.save_credentials_securely(request, creds, username, email)
         request.session["user_session_id"] = session_id
+        request.session["user_email"] = email
         
         return RedirectResponse(FRONTEND_DASHBOARD_URL, status_code=status.HTTP_302_FOUND)
         
@@ -44,6 +45,7 @@ async def google_auth_callback(request: Request, code: str = None, state: str =
 async def logout(request: Request):
     """Clears the session from the browser and the database."""
     session_id = request.session.pop("user_session_id", None)
+    request.session.pop("user_email", None)
     
     if session_id:
         await auth_service.delete_session(request, session_id)
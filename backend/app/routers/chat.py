@@ -1,35 +1,177 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from app.services import ai_service, gmail_service
-from app.dependencies import get_current_user_credentials
-from app.models.chat import CommandRequest, ActionConfirmationRequest # Import CommandRequest
+import asyncio
+import time
+from typing import get_args
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.services import (
+    ai_service, deadline_service, dedup_service, gmail_service, outbox_service,
+    search_service, session_cache_service, triage_service
+)
+from app.dependencies import get_current_user_credentials, get_session_id, get_user_id
+from app.models.chat import CommandRequest, ActionConfirmationRequest, EmailField # Import CommandRequest
 
 router = APIRouter(
     prefix="/api/chat",
     tags=["Chatbot"]
 )
 
-async def find_target_email_id(creds, params):
-    """Helper function to find the email ID based on parsed NLP parameters."""
+async def find_target_email_id(creds, params, user_id: str = None, command: str = None,
+                               db=None, session_id: str = None):
+    """
+    Helper function to find the email ID based on parsed NLP parameters.
+    Returns (email_id, semantic_match): semantic_match is the matched email's sender and
+    subject when the target came from semantic search (a best guess the user should see),
+    otherwise None. email_id is None when nothing matched.
+    """
     sender = params.get("sender")
     subject = params.get("subject_keyword")
+
+    # 'email_number' refers to the session's last listing, which is cached locally.
+    if params.get("email_number") and db is not None:
+        try:
+            listed = await session_cache_service.get_listed_email(db, session_id, params["email_number"])
+        except Exception as e:
+            print(f"Session cache error: {e}")
+            listed = None
+        if listed:
+            return listed["id"], None
     
     if sender or subject:
-        return await gmail_service.find_email_id_by_query(creds, sender=sender, subject_keyword=subject)
+        email_id = await gmail_service.find_email_id_by_query(creds, sender=sender, subject_keyword=subject)
+        if email_id:
+            return email_id, None
     
-    # NOTE: We skip 'email_number' parsing here, as that is only reliable for previously listed emails.
-    return None
+    # Keyword search missed: fall back to the user's local semantic index of fetched mail.
+    if user_id and command:
+        after = None
+        if params.get("within_days"):
+            after = int((time.time() - params["within_days"] * 86400) * 1000)
+        try:
+            matches = await search_service.semantic_search(user_id, command, sender=sender, after=after, top_k=1)
+        except Exception as e:
+            print(f"Semantic search error: {e}")
+            matches = []
+        if matches:
+            email_id = matches[0][0]
+            match = await run_in_threadpool(search_service.get_index(user_id).describe, email_id)
+            return email_id, match or {}
+
+    return None, None
+
+def semantic_match_text(match: dict | None) -> str:
+    """Names a semantic search hit so the user can check it before confirming."""
+    if match is None:
+        return "I found an email matching your request."
+    sender = match.get("sender") or "an unknown sender"
+    subject = match.get("subject") or "(no subject)"
+    return f"I couldn't find an exact match; the closest email is from {sender} with the subject '{subject}'."
+
+def select_email_fields(email: dict, fields: list | None) -> dict:
+    """
+    Trims an email dict down to the requested fields, or to every EmailField if none are given.
+    Keys used only internally (labels, headers for triage and replies) are never returned.
+    The 'id' is always kept.
+    """
+    allowed = fields or get_args(EmailField)
+    return {key: value for key, value in email.items() if key == "id" or key in allowed}
+
+async def triage_emails(db, user_id: str, emails: list) -> list:
+    """Scores the batch and returns it ordered by triage score, each email carrying its 'triage'."""
+    try:
+        replied_to = await outbox_service.get_replied_recipients(db, user_id)
+    except Exception as e:
+        print(f"Triage history error: {e}")
+        replied_to = set()
+    sender_counts = await run_in_threadpool(search_service.get_index(user_id).sender_counts)
+    triage = triage_service.score_emails(user_id, emails, replied_to, sender_counts)
+    return [{**emails[i], "triage": triage[i]} for i in triage_service.rank(triage)]
+
+def selected_clusters(clusters: list, selected: set) -> list:
+    """Clusters with at least one selected member; the whole cluster shares that summary."""
+    return [cluster for cluster in clusters if any(index in selected for index in cluster)]
+
+def snippet_summary(email: dict) -> str:
+    """Stands in for an LLM summary of emails that are not summarized."""
+    return email.get("snippet") or ai_service.extract_summary(email["body"])
+
+async def summarize_clusters(emails: list, fingerprints: list, clusters: list, user_id: str,
+                             selected: set = None) -> tuple[dict, bool]:
+    """
+    Summarizes one representative per near-duplicate cluster. The summary is copied only to
+    members whose text is identical to the representative's; near-duplicates can still
+    differ in the words that matter (names, 'approved' vs 'rejected').
+    A summary of an identical email from the user's recent history is reused.
+    If 'selected' is given, only clusters with a selected index are summarized.
+    Returns (summaries keyed by email index, whether any summary was cut by the deadline);
+    indices without a summary should show their own snippet.
+    """
+    degraded = False
+    chosen = clusters if selected is None else selected_clusters(clusters, selected)
+    keys = dedup_service.content_keys(emails)
+
+    async def summarize(cluster):
+        nonlocal degraded
+        representative = cluster[0]
+        email = emails[representative]
+        if cluster not in chosen:
+            for _ in cluster:
+                ai_service.record_routing("summary", "triaged_out")
+            return None
+
+        key = keys[representative]
+        summary = dedup_service.recent_summary(user_id, key)
+        if summary is None:
+            budget = deadline_service.remaining()
+            try:
+                if budget is not None and budget < settings.SUMMARY_MIN_BUDGET_SECONDS:
+                    raise deadline_service.DeadlineExceeded("summary")
+                summary = await ai_service.generate_summary(email["body"], email.get("snippet"), user_id)
+                dedup_service.remember_summary(user_id, key, summary)
+            except deadline_service.DeadlineExceeded:
+                for _ in cluster:
+                    ai_service.record_routing("summary", "deadline_snippet")
+                degraded = True
+                return None
+        else:
+            ai_service.record_routing("summary", "recent_duplicate")
+        for index in cluster[1:]:
+            ai_service.record_routing("summary", "duplicate" if keys[index] == key else "similar_snippet")
+        return summary
+
+    # Summaries run concurrently; the bulk lane of the LLM scheduler bounds how many at once.
+    cluster_summaries = await asyncio.gather(*(summarize(cluster) for cluster in clusters))
+    return {
+        index: summary
+        for cluster, summary in zip(clusters, cluster_summaries) if summary is not None
+        for index in cluster if keys[index] == keys[cluster[0]]
+    }, degraded
+
+def unsummarized_text(email: dict, index: int, similar_to: dict) -> str:
+    """The email's own snippet, labelled with the listing number of its cluster's representative."""
+    if index in similar_to:
+        return f"Similar to #{similar_to[index] + 1}: {snippet_summary(email)}"
+    return snippet_summary(email)
 
 @router.post("/command")
 async def handle_chatbot_command(
+    request: Request,
     command_data: CommandRequest, 
-    creds_tuple: tuple = Depends(get_current_user_credentials)
+    background_tasks: BackgroundTasks,
+    creds_tuple: tuple = Depends(get_current_user_credentials),
+    user_id: str = Depends(get_user_id),
+    session_id: str = Depends(get_session_id)
 ):
     """Processes a natural language command from the user."""
     creds, username = creds_tuple
     command = command_data.command
     
     # 1. AI Intent Parsing (Now more powerful)
-    intent = await ai_service.parse_user_intent(command)
+    try:
+        intent = await ai_service.parse_user_intent(command, user_id)
+    except deadline_service.DeadlineExceeded as e:
+        print(f"Deadline exceeded parsing intent: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="The AI service took too long to respond. Please try again.")
     action = intent.get("action")
     params = intent.get("params", {})
     
@@ -38,23 +180,27 @@ async def handle_chatbot_command(
     # ----------------------------------------------------
     
     if action == "delete":
-        email_id = await find_target_email_id(creds, params)
+        email_id, match = await find_target_email_id(creds, params, user_id, command, request.app.mongodb, session_id)
         if email_id:
             # Found the target, now immediately ask for confirmation (Part 3.3 requirement)
             return {
-                "response": f"I found an email matching your request. Are you sure you want to delete it?",
+                "response": f"{semantic_match_text(match)} Are you sure you want to delete it?",
                 "action": "confirm_delete",
                 "data": {"email_id": email_id}
             }
         
     elif action == "respond" and params.get("reply_content"):
-        email_id = await find_target_email_id(creds, params)
+        email_id, match = await find_target_email_id(creds, params, user_id, command, request.app.mongodb, session_id)
         reply_content = params.get("reply_content")
         
         if email_id:
             # Found the target and the reply content, now present the draft for confirmation
+            if match is None:
+                found = f"I drafted the following reply for the email from '{params.get('sender', 'the recipient')}'."
+            else:
+                found = f"{semantic_match_text(match)} I drafted the following reply to it."
             return {
-                "response": f"I drafted the following reply for the email from '{params.get('sender', 'the recipient')}'. Confirm sending?",
+                "response": f"{found} Confirm sending?",
                 "action": "confirm_send",
                 "data": {
                     "original_email_id": email_id,
@@ -70,16 +216,49 @@ async def handle_chatbot_command(
         if action == "read":
             count = params.get("count", 5)
             emails = await gmail_service.fetch_latest_emails(creds, count=count)
-            
-            summaries = []
-            for email in emails:
-                summary = await ai_service.generate_summary(email["body"])
-                summaries.append({**email, "summary": summary})
+            gmail_service.remember_reply_metadata(user_id, emails)
+            background_tasks.add_task(search_service.index_emails, user_id, emails)
+            fields = command_data.fields
+
+            # Triage orders the batch; only the top-K are sent to the LLM for summaries.
+            emails = await triage_emails(request.app.mongodb, user_id, emails)
+            top_k = set(range(settings.TRIAGE_SUMMARY_TOP_K))
+            try:
+                await session_cache_service.save_listing(request.app.mongodb, session_id, emails)
+            except Exception as e:
+                print(f"Session cache error: {e}")
+
+            # Near-duplicates are grouped so each cluster is summarized once.
+            fingerprints = dedup_service.fingerprint_emails(emails)
+            clusters = dedup_service.cluster_fingerprints(fingerprints)
+            degraded = False
+            summarized = not fields or "summary" in fields
+            if summarized:
+                summary_by_index, degraded = await summarize_clusters(emails, fingerprints, clusters, user_id, top_k)
+                similar_to = {index: cluster[0] for cluster in clusters for index in cluster[1:]}
+                emails = [
+                    {
+                        **email,
+                        "summary": summary_by_index[i] if i in summary_by_index else unsummarized_text(email, i, similar_to),
+                        "triage": {**email["triage"], "summarized": i in summary_by_index}
+                    }
+                    for i, email in enumerate(emails)
+                ]
+            summaries = [select_email_fields(email, fields) for email in emails]
 
+            # Results are in triage order, not Gmail's date order.
+            response = f"Fetched your last {len(summaries)} emails, most important first:"
+            if summarized and len(summaries) > settings.TRIAGE_SUMMARY_TOP_K:
+                response = (
+                    f"Fetched your last {len(summaries)} emails, most important first. "
+                    f"The top {settings.TRIAGE_SUMMARY_TOP_K} are summarized; the rest show their snippets:"
+                )
+            if degraded:
+                response = f"Fetched your last {len(summaries)} emails, most important first. Some are shown as snippets because summarizing took too long:"
             return {
-                "response": f"Found the last {len(summaries)} emails, summarized below:",
+                "response": response,
                 "action": "read_success",
-                "data": {"emails": summaries}
+                "data": {"emails": summaries, "groups": dedup_service.describe_groups(emails, clusters), "degraded": degraded}
             }
 
         elif action in ["respond", "delete"]:
@@ -95,6 +274,9 @@ async def handle_chatbot_command(
                 "action": "unknown"
             }
 
+    except deadline_service.DeadlineExceeded as e:
+        print(f"Deadline exceeded processing command: {e}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Gmail or the AI service took too long to respond. Please try again.")
     except Exception as e:
         print(f"Error processing command: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An error occurred while contacting Gmail or the AI service.")
@@ -103,7 +285,8 @@ async def handle_chatbot_command(
 @router.post("/suggest-reply")
 async def suggest_reply(
     request_data: ActionConfirmationRequest, 
-    creds_tuple: tuple = Depends(get_current_user_credentials)
+    creds_tuple: tuple = Depends(get_current_user_credentials),
+    user_id: str = Depends(get_user_id)
 ):
     """Fetches an email and generates a proposed reply using AI."""
     creds, _ = creds_tuple
@@ -115,9 +298,10 @@ async def suggest_reply(
         
         if not email_data:
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found or access denied.")
+        gmail_service.remember_reply_metadata(user_id, [email_data])
              
         # 2. Generate the reply
-        proposed_reply = await ai_service.generate_proposed_reply(email_data["body"])
+        proposed_reply = await ai_service.generate_proposed_reply(email_data["body"], user_id)
         
         return {
             "response": f"Proposed reply for subject '{email_data['subject']}':",
@@ -132,6 +316,24 @@ async def suggest_reply(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate AI reply.")
 
 
+# Lazy body fetch for read results requested without the 'body' field
+@router.get("/emails/{email_id}")
+async def get_email_content(
+    email_id: str,
+    creds_tuple: tuple = Depends(get_current_user_credentials),
+    user_id: str = Depends(get_user_id)
+):
+    """Returns the full content of a single email."""
+    creds, _ = creds_tuple
+    email_data = await gmail_service.fetch_single_email_content(creds, email_id)
+
+    if not email_data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Email not found or access denied.")
+    gmail_service.remember_reply_metadata(user_id, [email_data])
+
+    return email_data
+
+
 # UPDATED ENDPOINT: Confirm Delete with explicit 403 scope handling
 @router.post("/delete-email")
 async def confirm_delete(
@@ -167,21 +369,59 @@ async def get_user_profile(creds_tuple: tuple = Depends(get_current_user_credent
     _, username = creds_tuple
     return {"name": username}
 
-# Endpoint for confirming and sending the reply (called from a button in the React UI)
-@router.post("/send-reply")
+# Endpoint for confirming and sending the reply (called from a button in the React UI).
+# The reply is persisted to the outbox and sent by the background sender; repeats of the
+# same Idempotency-Key (or the same reply body, when no key is sent) are not sent twice.
+# The endpoint never calls Gmail: reply metadata comes from this worker's fetch cache or the
+# session's listing, and otherwise the sender resolves it before sending.
+@router.post("/send-reply", status_code=status.HTTP_202_ACCEPTED)
 async def send_email_reply(
+    request: Request,
     reply_data: ActionConfirmationRequest, 
-    creds_tuple: tuple = Depends(get_current_user_credentials)
+    creds_tuple: tuple = Depends(get_current_user_credentials),
+    user_id: str = Depends(get_user_id),
+    session_id: str = Depends(get_session_id),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key")
 ):
-    creds, _ = creds_tuple
     email_id = reply_data.email_id
     reply_body = reply_data.reply_body
+
+    if not email_id or not reply_body:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email ID and reply body are required.")
     
+    metadata = gmail_service.get_cached_reply_metadata(user_id, email_id)
+    if metadata is None:
+        try:
+            listed = await session_cache_service.get_listed_email_by_id(request.app.mongodb, session_id, email_id)
+        except Exception as e:
+            print(f"Session cache error: {e}")
+            listed = None
+        if listed:
+            metadata = gmail_service.reply_metadata(listed)
+
     try:
-        if await gmail_service.send_reply(creds, email_id, reply_body):
-            return {"response": "✅ Reply sent successfully!", "action": "status"}
-        else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send reply via Gmail API.")
+        entry = await outbox_service.enqueue_reply(
+            request.app.mongodb, user_id, session_id, email_id, reply_body, metadata, idempotency_key
+        )
     except Exception as e:
-        print(f"Error sending email: {e}")
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred during email sending.")
\ No newline at end of file
+        print(f"Error queueing email: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred while queueing the reply.")
+
+    if entry["status"] == "sent":
+        message = "✅ Reply sent successfully!"
+    else:
+        message = "📤 Reply queued for sending."
+    return {"response": message, "action": "status", "data": entry}
+
+@router.get("/send-reply/{outbox_id}")
+async def get_reply_status(
+    outbox_id: str,
+    request: Request,
+    creds_tuple: tuple = Depends(get_current_user_credentials),
+    user_id: str = Depends(get_user_id)
+):
+    """Returns the delivery status of a queued reply."""
+    entry = await outbox_service.get_status(request.app.mongodb, user_id, outbox_id)
+    if not entry:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Queued reply not found.")
+    return entry
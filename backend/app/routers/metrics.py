@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from app.services import ai_service, deadline_service
+
+router = APIRouter(
+    prefix="/api/metrics",
+    tags=["Metrics"]
+)
+
+@router.get("")
+async def get_metrics():
+    """Returns in-process counters for this worker."""
+    return {
+        "ai_routing": ai_service.get_routing_metrics(),
+        "llm_lanes": ai_service.llm_scheduler.get_metrics(),
+        "upstream_latency": deadline_service.latency_tracker.get_metrics()
+    }
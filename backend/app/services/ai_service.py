@@ -1,11 +1,170 @@
+import asyncio
 import json
+import re
+from collections import Counter
+import numpy as np
 from google import genai
 from google.genai import types
 from app.config import settings
+from app.services import deadline_service
+from app.services.llm_scheduler import LLMScheduler
 
 client = genai.Client(api_key=settings.GEMINI_API_KEY)
 
-async def parse_user_intent(command: str) -> dict:
+# Interactive work (intent parsing, replies) is always served before bulk summarization,
+# and bulk work is capped below the ceiling so it can never take every slot.
+INTERACTIVE_LANE = "interactive"
+BULK_LANE = "bulk"
+llm_scheduler = LLMScheduler(
+    settings.LLM_MAX_CONCURRENCY,
+    {INTERACTIVE_LANE: settings.LLM_MAX_CONCURRENCY, BULK_LANE: settings.LLM_BULK_MAX_CONCURRENCY}
+)
+
+# Counts of model cascade decisions, keyed by "<task>:<strategy>"
+routing_metrics = Counter()
+
+REPLY_HEADER_PATTERN = re.compile(
+    r"^(On\b.*\bwrote:|-+ ?(Original|Forwarded) [Mm]essage ?-+|Begin forwarded message:)$"
+)
+HEADER_FIELD_PATTERN = re.compile(r"^(From|Sent|Date|To|Cc|Subject): ")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s")
+
+
+def count_quoted_replies(text: str) -> int:
+    """
+    Counts the earlier messages quoted in a thread. Each reply header ('On ... wrote:',
+    'Original Message', a forwarded or Outlook From:/Sent: block) is one reply, as is each
+    contiguous run of '>' lines that is not already introduced by such a header.
+    """
+    lines = [line.strip() for line in (text or "").splitlines()] + [""]
+    replies = 0
+    after_header = False  # The next '>' block belongs to the header just counted.
+    in_quote = False
+    i = 0
+    while i < len(lines) - 1:
+        line, next_line = lines[i], lines[i + 1]
+        if not line:
+            in_quote = False
+        elif line.startswith(">"):
+            if not in_quote and not after_header:
+                replies += 1
+            in_quote = True
+            after_header = False
+        elif REPLY_HEADER_PATTERN.match(line) or (line.startswith("On ") and REPLY_HEADER_PATTERN.match(f"{line} {next_line}")):
+            if not REPLY_HEADER_PATTERN.match(line):
+                i += 1  # 'On ... wrote:' wrapped onto two lines.
+            replies += 1
+            after_header = True
+            in_quote = False
+        elif HEADER_FIELD_PATTERN.match(line):
+            # An Outlook-style block ('From:' then 'Sent:' or 'Date:'), unless a header already introduced it.
+            if line.startswith("From: ") and not after_header and re.match(r"(Sent|Date): ", next_line):
+                replies += 1
+                after_header = True
+            in_quote = False
+        else:
+            after_header = False
+            in_quote = False
+        i += 1
+    return replies
+
+
+def choose_model_strategy(text: str, allow_extract: bool = True) -> str:
+    """
+    Picks the cheapest strategy that can handle the input:
+    'extract' (no LLM) for very short text, 'light' for medium text,
+    and 'full' for long text or threads with several quoted replies.
+    """
+    text = (text or "").strip()
+    quoted_replies = count_quoted_replies(text)
+
+    if allow_extract and len(text) <= settings.SUMMARY_EXTRACT_MAX_CHARS and quoted_replies == 0:
+        return "extract"
+    if len(text) <= settings.LIGHT_MODEL_MAX_CHARS and quoted_replies <= settings.LIGHT_MODEL_MAX_QUOTED_REPLIES:
+        return "light"
+    return "full"
+
+
+def model_for_strategy(strategy: str) -> str:
+    return settings.GEMINI_LIGHT_MODEL if strategy == "light" else settings.GEMINI_MODEL
+
+
+def extract_summary(text: str) -> str:
+    """Returns the first sentence of a short text, collapsed onto one line."""
+    text = " ".join((text or "").split())
+    return SENTENCE_END_PATTERN.split(text, maxsplit=1)[0]
+
+
+def record_routing(task: str, strategy: str):
+    routing_metrics[f"{task}:{strategy}"] += 1
+
+
+def get_routing_metrics() -> dict:
+    return dict(routing_metrics)
+
+
+async def generate_content(lane: str, user_id: str = None, **kwargs):
+    """
+    Runs a Gemini generate_content call once the scheduler grants a slot in the lane.
+    The wait and the call are bounded by the request deadline, and slow calls are hedged.
+    """
+    return await admitted_call(
+        lane, user_id, f"gemini.{kwargs.get('model')}", lambda: client.models.generate_content(**kwargs)
+    )
+
+
+async def admitted_call(lane: str, user_id: str, name: str, make_call):
+    """
+    Runs a blocking Gemini call under the scheduler and the request deadline.
+
+    Every attempt holds its own slot until its thread finishes: a hedge starts only if a
+    slot is free, and an attempt abandoned by a deadline or a winning hedge keeps its slot
+    until it returns. Calls in flight therefore never exceed LLM_MAX_CONCURRENCY.
+    """
+    budget = deadline_service.remaining()
+    if budget is not None and budget <= 0:
+        raise deadline_service.DeadlineExceeded(name)
+    try:
+        await llm_scheduler.acquire(lane, user_id or "anonymous", timeout=budget)
+    except asyncio.TimeoutError:
+        raise deadline_service.DeadlineExceeded(f"queued for {lane} lane")
+
+    held = 1
+    attempts = []
+
+    def admit_hedge() -> bool:
+        nonlocal held
+        if llm_scheduler.try_acquire(lane):
+            held += 1
+            return True
+        return False
+
+    try:
+        return await deadline_service.hedged_call(name, make_call, admit_hedge=admit_hedge, attempts=attempts)
+    finally:
+        for task in attempts:
+            task.add_done_callback(lambda _: llm_scheduler.release(lane))
+        for _ in range(held - len(attempts)):
+            llm_scheduler.release(lane)
+
+INTENT_PARAMS = ("count", "sender", "subject_keyword", "email_number", "reply_content", "within_days")
+
+def normalize_intent(intent: dict) -> dict:
+    """
+    The response schema is flat (parameters sit beside 'action'); callers expect
+    {"action", "params"}. Top-level parameters are moved into 'params', and an
+    already-nested 'params' is kept. Null values are dropped.
+    """
+    params = dict(intent.get("params") or {})
+    for key in INTENT_PARAMS:
+        if intent.get(key) is not None:
+            params.setdefault(key, intent[key])
+    return {
+        "action": intent.get("action", "unknown"),
+        "params": {key: value for key, value in params.items() if value is not None},
+    }
+
+async def parse_user_intent(command: str, user_id: str = None) -> dict:
     schema = types.Schema(
         type=types.Type.OBJECT,
         properties={
@@ -14,7 +173,8 @@ async def parse_user_intent(command: str) -> dict:
             "sender": types.Schema(type=types.Type.STRING),
             "subject_keyword": types.Schema(type=types.Type.STRING),
             "email_number": types.Schema(type=types.Type.INTEGER),
-            "reply_content": types.Schema(type=types.Type.STRING)
+            "reply_content": types.Schema(type=types.Type.STRING),
+            "within_days": types.Schema(type=types.Type.INTEGER)
         },
         required=["action"]
     )
@@ -24,39 +184,54 @@ async def parse_user_intent(command: str) -> dict:
         "into structured JSON commands. Analyze the user command and extract all relevant parameters. "
         "If the user wants to reply with specific content (e.g., 'Reply to John that I'm busy'), "
         "extract the entire reply message into 'reply_content'."
+        "If the user refers to when an email arrived (e.g., 'from last week'), set 'within_days' to the number of days to look back."
         "If the action is 'read', default 'count' to 5 if no number is specified."
         "Only output a single JSON object strictly matching the provided schema. Do not output any text outside the JSON object."
     )
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
+    response = await generate_content(
+        INTERACTIVE_LANE,
+        user_id,
+        model=settings.GEMINI_MODEL,
         contents=[system_prompt, command],
         config=types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
     )
     
     try:
         response_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(response_text)
+        return normalize_intent(json.loads(response_text))
     except json.JSONDecodeError:
         print(f"JSON Decode Error on AI response: {response.text}")
         return {"action": "unknown", "params": {}}
 
 
-async def generate_summary(email_body: str) -> str:
+async def generate_summary(email_body: str, snippet: str = None, user_id: str = None) -> str:
+    strategy = choose_model_strategy(email_body)
+    record_routing("summary", strategy)
+
+    if strategy == "extract":
+        return extract_summary(email_body or snippet)
+
     prompt = (
         "Condense the following email body into a single, short, and concise summary "
         "of the main topic and required action (if any). Do not exceed two sentences."
         f"\n\nEMAIL CONTENT:\n---\n{email_body}"
     )
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
+    response = await generate_content(
+        BULK_LANE,
+        user_id,
+        model=model_for_strategy(strategy),
         contents=prompt
     )
     return response.text.strip()
 
 
-async def generate_proposed_reply(original_email_content: str) -> str:
+async def generate_proposed_reply(original_email_content: str, user_id: str = None) -> str:
+    # A reply always needs generating, so the cascade starts at the light model.
+    strategy = choose_model_strategy(original_email_content, allow_extract=False)
+    record_routing("reply", strategy)
+
     prompt = (
         "Based on the following email content, generate a professional, clear, "
         "and ready-to-send reply. Assume a standard closing (e.g., 'Best regards, [Your Name]'). "
@@ -64,8 +239,39 @@ async def generate_proposed_reply(original_email_content: str) -> str:
         f"\n\n--- ORIGINAL EMAIL ---\n{original_email_content}"
     )
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
+    response = await generate_content(
+        INTERACTIVE_LANE,
+        user_id,
+        model=model_for_strategy(strategy),
         contents=prompt
     )
     return response.text.strip()
+
+
+def embed_texts(texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray:
+    """
+    Embeds texts in batches and returns an (N, EMBEDDING_DIMENSIONS) float32 array
+    of L2-normalized vectors, so cosine similarity is a plain dot product.
+    """
+    vectors = []
+    for start in range(0, len(texts), settings.EMBEDDING_BATCH_SIZE):
+        response = client.models.embed_content(
+            model=settings.GEMINI_EMBEDDING_MODEL,
+            contents=texts[start:start + settings.EMBEDDING_BATCH_SIZE],
+            config=types.EmbedContentConfig(
+                task_type=task_type,
+                output_dimensionality=settings.EMBEDDING_DIMENSIONS
+            )
+        )
+        vectors.extend(embedding.values for embedding in response.embeddings)
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, settings.EMBEDDING_DIMENSIONS)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+async def embed(texts: list[str], lane: str, user_id: str = None, task_type: str = "RETRIEVAL_DOCUMENT") -> np.ndarray:
+    """embed_texts under the LLM scheduler and the request deadline, like every other Gemini call."""
+    return await admitted_call(
+        lane, user_id, f"gemini.{settings.GEMINI_EMBEDDING_MODEL}", lambda: embed_texts(texts, task_type)
+    )
@@ -64,7 +64,10 @@ async def save_credentials_securely(request: Request, creds: Credentials, userna
     return session_id
 
 async def load_and_refresh_tokens(request: Request, session_id: str):
-    db = get_database(request)
+    return await load_and_refresh_tokens_from_db(get_database(request), session_id)
+
+async def load_and_refresh_tokens_from_db(db, session_id: str):
+    """Same as load_and_refresh_tokens, for callers without a request (e.g. background workers)."""
     collection = db[settings.MONGO_COLLECTION_NAME]
     
     user_data = await collection.find_one({"_id": session_id})
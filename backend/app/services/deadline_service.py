@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+
+# Each request carries an absolute deadline (time.monotonic()) in a context variable, so
+# gmail_service and ai_service see the remaining budget without threading it through every call.
+_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when an upstream call cannot finish within the request's time budget."""
+
+
+def set_deadline(seconds: float):
+    """Starts a budget for the current context. Returns a token for reset_deadline."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def clear_deadline():
+    """Drops the budget for the current context, e.g. for work that runs after the response. Returns a token for reset_deadline."""
+    return _deadline.set(None)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current budget, or None when no deadline is set."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def parse_budget_header(value: bytes) -> float:
+    """
+    Seconds of budget for an X-Request-Budget-Ms value. Clients may only shorten the
+    default budget; values that are malformed, zero, negative or longer fall back to it.
+    """
+    try:
+        budget = int(value) / 1000
+    except ValueError:
+        return settings.REQUEST_BUDGET_SECONDS
+    if 0 < budget <= settings.REQUEST_BUDGET_SECONDS:
+        return budget
+    return settings.REQUEST_BUDGET_SECONDS
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving every HTTP request a budget, optionally shortened by X-Request-Budget-Ms."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        budget = settings.REQUEST_BUDGET_SECONDS
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-budget-ms":
+                budget = parse_budget_header(value)
+                break
+
+        token = set_deadline(budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_deadline(token)
+
+
+class LatencyTracker:
+    """Rolling per-call latency windows. The observed p95 is the delay after which a call is hedged."""
+
+    def __init__(self, window: int, min_samples: int, max_hedge_ratio: float):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.samples = {}
+        self.calls = {}
+        self.hedges = {}
+
+    def record(self, name: str, seconds: float):
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+        self.samples[name].append(seconds)
+
+    def percentile(self, name: str, p: float) -> float | None:
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def hedge_delay(self, name: str) -> float | None:
+        """The p95 once enough samples exist; None means the call is not hedged."""
+        if len(self.samples.get(name, ())) < self.min_samples:
+            return None
+        return self.percentile(name, 0.95)
+
+    def start_call(self, name: str):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def can_hedge(self, name: str) -> bool:
+        """Hedges stay under max_hedge_ratio of calls, capping the extra load."""
+        return self.hedges.get(name, 0) < self.max_hedge_ratio * self.calls.get(name, 0)
+
+    def record_hedge(self, name: str):
+        self.hedges[name] = self.hedges.get(name, 0) + 1
+
+    def try_hedge(self, name: str) -> bool:
+        if not self.can_hedge(name):
+            return False
+        self.record_hedge(name)
+        return True
+
+    def get_metrics(self) -> dict:
+        return {
+            name: {
+                "samples": len(samples),
+                "p50_ms": round(self.percentile(name, 0.50) * 1000, 1),
+                "p95_ms": round(self.percentile(name, 0.95) * 1000, 1),
+                "calls": self.calls.get(name, 0),
+                "hedges": self.hedges.get(name, 0)
+            }
+            for name, samples in self.samples.items()
+        }
+
+
+latency_tracker = LatencyTracker(
+    settings.HEDGE_LATENCY_WINDOW, settings.HEDGE_MIN_SAMPLES, settings.HEDGE_MAX_RATIO
+)
+
+
+def _consume_result(task: asyncio.Task):
+    # Losing attempts keep running in their threads; retrieve their outcome so nothing is logged as unhandled.
+    if not task.cancelled():
+        task.exception()
+
+
+async def hedged_call(name: str, make_call, hedge: bool = True, admit_hedge=None, attempts: list = None):
+    """
+    Runs the blocking make_call() in the threadpool within the current deadline.
+
+    If it has not finished after the observed p95 for `name`, an identical attempt is
+    started and the first successful result wins. Only use this for idempotent calls.
+    Raises DeadlineExceeded when the budget runs out first.
+
+    Attempts that lose, or that are still running when the deadline passes, keep running
+    in their threads. Callers that bound concurrency pass `admit_hedge` (returns whether a
+    hedge may start) and `attempts` (receives every launched task) to account for them.
+    """
+    budget = remaining()
+    if budget is not None and budget <= 0:
+        raise DeadlineExceeded(name)
+
+    def launch():
+        task = asyncio.ensure_future(run_in_threadpool(make_call))
+        task.add_done_callback(_consume_result)
+        if attempts is not None:
+            attempts.append(task)
+        return task
+
+    start = time.monotonic()
+    latency_tracker.start_call(name)
+    hedge_at = latency_tracker.hedge_delay(name) if hedge else None
+    pending = {launch()}
+    error = None
+
+    while pending:
+        timeout = remaining()
+        if hedge_at is not None:
+            until_hedge = hedge_at - (time.monotonic() - start)
+            timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+
+        done, pending = await asyncio.wait(
+            pending, timeout=None if timeout is None else max(timeout, 0), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            if task.exception() is None:
+                latency_tracker.record(name, time.monotonic() - start)
+                return task.result()
+            error = task.exception()
+
+        if not done:
+            left = remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded(name)
+            if hedge_at is not None:
+                hedge_at = None
+                if latency_tracker.can_hedge(name) and (admit_hedge is None or admit_hedge()):
+                    latency_tracker.record_hedge(name)
+                    pending.add(launch())
+
+    raise error
@@ -0,0 +1,155 @@
+import hashlib
+import re
+from collections import OrderedDict
+from email.utils import parseaddr
+import numpy as np
+from app.config import settings
+
+# Near-duplicate detection with 64-bit SimHash fingerprints over normalized bodies.
+# Templated mail (notifications, newsletters, alerts) differs mostly in numbers and links,
+# so those are normalized away before shingling. Names and wording are kept, but a few
+# changed words still land within the clustering distance ("approved" vs "rejected").
+# Clusters are therefore only for grouping: a summary is copied verbatim only between
+# emails whose text is identical (same content key), never between mere near-duplicates.
+
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+EMAIL_PATTERN = re.compile(r"\S+@\S+")
+DIGITS_PATTERN = re.compile(r"\d+")
+NON_WORD_PATTERN = re.compile(r"[^\w\s]")
+QUOTED_LINE_PATTERN = re.compile(r"^>.*$", re.MULTILINE)
+
+# user_id -> OrderedDict of content key -> summary, for recently summarized mail
+_recent_summaries = OrderedDict()
+
+
+def normalize_text(text: str) -> str:
+    text = QUOTED_LINE_PATTERN.sub(" ", (text or "").lower())
+    text = URL_PATTERN.sub(" url ", text)
+    text = EMAIL_PATTERN.sub(" addr ", text)
+    text = DIGITS_PATTERN.sub("0", text)
+    return " ".join(NON_WORD_PATTERN.sub(" ", text).split())
+
+
+def simhash(text: str) -> int | None:
+    """
+    64-bit SimHash over word 3-shingles of the normalized text.
+    Returns None for texts too short to fingerprint reliably.
+    """
+    tokens = normalize_text(text).split()
+    if len(tokens) < settings.DEDUP_MIN_TOKENS:
+        return None
+
+    shingles = {" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles],
+        dtype=np.uint64
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(hashes)
+    return int(np.packbits(votes > 0, bitorder="little").view(np.uint64)[0])
+
+
+def email_text(email: dict) -> str:
+    return f"{email.get('subject', '')}\n{email.get('body') or email.get('snippet') or ''}"
+
+
+def fingerprint_emails(emails: list[dict]) -> list[int | None]:
+    return [simhash(email_text(email)) for email in emails]
+
+
+def content_key(text: str) -> str:
+    """Identifies an email's exact text, ignoring case and whitespace."""
+    text = " ".join((text or "").lower().split())
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def content_keys(emails: list[dict]) -> list[str]:
+    return [content_key(email_text(email)) for email in emails]
+
+
+def hamming_distances(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distances between two uint64 fingerprint arrays."""
+    return np.bitwise_count(left[:, None] ^ right[None, :])
+
+
+def cluster_fingerprints(fingerprints: list[int | None]) -> list[list[int]]:
+    """
+    Groups indices whose fingerprints are within DEDUP_SIMHASH_MAX_DISTANCE of the
+    cluster's first member. Order is preserved, so the first index is the highest-ranked
+    email (reads arrive in triage order).
+    """
+    eligible = [i for i, fingerprint in enumerate(fingerprints) if fingerprint is not None]
+    distances = None
+    if eligible:
+        values = np.array([fingerprints[i] for i in eligible], dtype=np.uint64)
+        distances = hamming_distances(values, values)
+    position = {index: pos for pos, index in enumerate(eligible)}
+
+    clusters = []
+    assigned = set()
+    for i in range(len(fingerprints)):
+        if i in assigned:
+            continue
+        cluster = [i]
+        assigned.add(i)
+        if i in position:
+            row = distances[position[i]]
+            for j in eligible:
+                if j not in assigned and row[position[j]] <= settings.DEDUP_SIMHASH_MAX_DISTANCE:
+                    cluster.append(j)
+                    assigned.add(j)
+        clusters.append(cluster)
+    return clusters
+
+
+def sender_name(sender: str) -> str:
+    name, address = parseaddr(sender or "")
+    return name or address or "Unknown Sender"
+
+
+def describe_groups(emails: list[dict], clusters: list[list[int]], keys: list[str] = None) -> list[dict]:
+    """
+    Presentation data for clusters with more than one email, e.g. '5 similar emails from GitHub'.
+    'details_differ' marks clusters whose members are not all identical, so only the
+    identical ones share the representative's summary.
+    """
+    keys = keys or content_keys(emails)
+    groups = []
+    for cluster in clusters:
+        if len(cluster) < 2:
+            continue
+        names = {sender_name(emails[i].get("sender")) for i in cluster}
+        label = f"{len(cluster)} similar emails"
+        if len(names) == 1:
+            label += f" from {names.pop()}"
+        groups.append({
+            "representative_id": emails[cluster[0]]["id"],
+            "email_ids": [emails[i]["id"] for i in cluster],
+            "count": len(cluster),
+            "label": label,
+            "details_differ": len({keys[i] for i in cluster}) > 1
+        })
+    return groups
+
+
+def recent_summary(user_id: str, key: str) -> str | None:
+    """Returns the summary of an identical email this user had summarized recently, if any."""
+    history = _recent_summaries.get(user_id)
+    if not history or key not in history:
+        return None
+    _recent_summaries.move_to_end(user_id)
+    history.move_to_end(key)
+    return history[key]
+
+
+def remember_summary(user_id: str, key: str, summary: str):
+    if user_id not in _recent_summaries:
+        _recent_summaries[user_id] = OrderedDict()
+    history = _recent_summaries[user_id]
+    history[key] = summary
+    history.move_to_end(key)
+    while len(history) > settings.DEDUP_RECENT_SUMMARIES:
+        history.popitem(last=False)
+    _recent_summaries.move_to_end(user_id)
+    while len(_recent_summaries) > settings.DEDUP_RECENT_USERS:
+        _recent_summaries.popitem(last=False)
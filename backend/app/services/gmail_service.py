@@ -1,21 +1,84 @@
+import asyncio
 import base64
+from collections import OrderedDict
 from email.mime.text import MIMEText
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 import re
+from app.config import settings
+from app.services import deadline_service
+
+UNKNOWN_SENDER = 'Unknown Sender'
+
+# Reply metadata (recipient, subject, thread) for fetched messages, keyed by (user, message ID).
+# This cache is per worker; read listings also persist it through session_cache_service.
+_reply_metadata_cache = OrderedDict()
+
+def reply_metadata(email: dict) -> dict | None:
+    """What a reply to a fetched email needs, derived from its sender, subject, thread and Message-ID."""
+    sender = email.get('sender')
+    if not sender or sender == UNKNOWN_SENDER:
+        return None
+    match = re.search(r'<(.*?)>', sender)
+    return {
+        "recipient": match.group(1) if match else sender,
+        "subject": f"Re: {email.get('subject') or 'No Subject'}",
+        "thread_id": email.get('thread_id'),
+        "message_id": email.get('message_id')
+    }
+
+def remember_reply_metadata(user_id: str, emails: list[dict]):
+    """Caches what replies to these emails need so sending does not have to refetch them."""
+    for email in emails:
+        metadata = reply_metadata(email)
+        if not metadata:
+            continue
+        key = (user_id, email['id'])
+        _reply_metadata_cache[key] = metadata
+        _reply_metadata_cache.move_to_end(key)
+    while len(_reply_metadata_cache) > settings.REPLY_METADATA_CACHE_SIZE:
+        _reply_metadata_cache.popitem(last=False)
+
+def get_cached_reply_metadata(user_id: str, email_id: str) -> dict | None:
+    return _reply_metadata_cache.get((user_id, email_id))
+
+def gmail_http(creds: Credentials) -> AuthorizedHttp:
+    """A fresh authorized HTTP client. httplib2 is not thread-safe, so concurrent and hedged attempts each get one."""
+    return AuthorizedHttp(creds, http=httplib2.Http())
 
 async def fetch_latest_emails(creds: Credentials, count: int = 5):
     service = build('gmail', 'v1', credentials=creds)
-    result = service.users().messages().list(userId='me', maxResults=count).execute()
+    result = await deadline_service.hedged_call(
+        "gmail.list",
+        lambda: service.users().messages().list(userId='me', maxResults=count).execute(http=gmail_http(creds))
+    )
     messages = result.get('messages', [])
+
+    semaphore = asyncio.Semaphore(settings.GMAIL_FETCH_CONCURRENCY)
+
+    async def fetch_detail(msg_id):
+        async with semaphore:
+            try:
+                return await deadline_service.hedged_call(
+                    "gmail.get",
+                    lambda: service.users().messages().get(userId='me', id=msg_id).execute(http=gmail_http(creds))
+                )
+            except deadline_service.DeadlineExceeded:
+                return None
+
+    details = await asyncio.gather(*(fetch_detail(msg['id']) for msg in messages))
     
     emails = []
-    for msg in messages:
-        msg_detail = service.users().messages().get(userId='me', id=msg['id']).execute()
+    for msg, msg_detail in zip(messages, details):
+        if msg_detail is None:
+            print(f"[gmail_service] Skipped message {msg['id']}: request budget exhausted.")
+            continue
         headers = {h['name']: h['value'] for h in msg_detail['payload']['headers']}
         
         subject = headers.get('Subject', 'No Subject')
-        sender = headers.get('From', 'Unknown Sender')
+        sender = headers.get('From', UNKNOWN_SENDER)
         email_id = msg['id']
         
         body_data = ""
@@ -30,7 +93,13 @@ async def fetch_latest_emails(creds: Credentials, count: int = 5):
             "sender": sender,
             "subject": subject,
             "body": body_data,
-            "snippet": msg_detail.get('snippet')
+            "snippet": msg_detail.get('snippet'),
+            "date": int(msg_detail.get('internalDate', 0)),
+            "thread_id": msg_detail.get('threadId'),
+            "message_id": headers.get('Message-ID') or headers.get('Message-Id'),
+            "labels": msg_detail.get('labelIds', []),
+            "list_unsubscribe": 'List-Unsubscribe' in headers,
+            "precedence": headers.get('Precedence')
         })
         
     return emails
@@ -38,7 +107,10 @@ async def fetch_latest_emails(creds: Credentials, count: int = 5):
 async def fetch_single_email_content(creds: Credentials, email_id: str):
     service = build('gmail', 'v1', credentials=creds)
     try:
-        msg_detail = service.users().messages().get(userId='me', id=email_id).execute()
+        msg_detail = await deadline_service.hedged_call(
+            "gmail.get",
+            lambda: service.users().messages().get(userId='me', id=email_id).execute(http=gmail_http(creds))
+        )
     except Exception:
         return None
 
@@ -53,10 +125,13 @@ async def fetch_single_email_content(creds: Credentials, email_id: str):
     
     return {
         "id": email_id,
-        "sender": headers.get('From', 'Unknown Sender'),
+        "sender": headers.get('From', UNKNOWN_SENDER),
         "subject": headers.get('Subject', 'No Subject'),
         "body": body_data,
-        "snippet": msg_detail.get('snippet')
+        "snippet": msg_detail.get('snippet'),
+        "date": int(msg_detail.get('internalDate', 0)),
+        "thread_id": msg_detail.get('threadId'),
+        "message_id": headers.get('Message-ID') or headers.get('Message-Id')
     }
 
 async def find_email_id_by_query(creds: Credentials, sender: str = None, subject_keyword: str = None) -> str | None:
@@ -73,11 +148,14 @@ async def find_email_id_by_query(creds: Credentials, sender: str = None, subject
         return None
 
     try:
-        result = service.users().messages().list(
-            userId='me', 
-            maxResults=1, 
-            q=full_query
-        ).execute()
+        result = await deadline_service.hedged_call(
+            "gmail.list",
+            lambda: service.users().messages().list(
+                userId='me', 
+                maxResults=1, 
+                q=full_query
+            ).execute(http=gmail_http(creds))
+        )
         
         messages = result.get('messages', [])
         
@@ -88,41 +166,73 @@ async def find_email_id_by_query(creds: Credentials, sender: str = None, subject
     except Exception:
         return None
 
-async def send_reply(creds: Credentials, original_message_id: str, reply_body: str):
+async def get_reply_metadata(creds: Credentials, user_id: str, original_message_id: str) -> dict | None:
+    """Returns recipient/subject/thread for a reply, from the fetch cache when possible."""
+    cached = get_cached_reply_metadata(user_id, original_message_id)
+    if cached:
+        return cached
+
     service = build('gmail', 'v1', credentials=creds)
-    
-    original_msg = service.users().messages().get(
-        userId='me', 
-        id=original_message_id, 
-        format='metadata', 
-        metadataHeaders=['From', 'Subject']
-    ).execute()
+    original_msg = await deadline_service.hedged_call(
+        "gmail.get_metadata",
+        lambda: service.users().messages().get(
+            userId='me', 
+            id=original_message_id, 
+            format='metadata', 
+            metadataHeaders=['From', 'Subject', 'Message-ID']
+        ).execute(http=gmail_http(creds))
+    )
 
     headers = {h['name']: h['value'] for h in original_msg['payload']['headers']}
-    
-    recipient_header = headers.get('From')
-    if not recipient_header: 
-        return False
+    email = {
+        "id": original_message_id,
+        "sender": headers.get('From'),
+        "subject": headers.get('Subject', 'No Subject'),
+        "thread_id": original_msg.get('threadId'),
+        "message_id": headers.get('Message-ID') or headers.get('Message-Id')
+    }
+    remember_reply_metadata(user_id, [email])
+    return reply_metadata(email)
 
-    match = re.search(r'<(.*?)>', recipient_header)
-    recipient_email = match.group(1) if match else recipient_header
+async def send_prepared_reply(creds: Credentials, metadata: dict, reply_body: str, message_id: str = None) -> str:
+    """Sends a reply from prepared metadata and returns the sent message's Gmail ID. Raises on API errors."""
+    service = build('gmail', 'v1', credentials=creds)
 
-    subject = f"Re: {headers.get('Subject', 'No Subject')}"
-    
     message = MIMEText(reply_body)
-    message['to'] = recipient_email
-    message['subject'] = subject
+    message['to'] = metadata['recipient']
+    message['subject'] = metadata['subject']
+    if metadata.get('message_id'):
+        message['In-Reply-To'] = metadata['message_id']
+        message['References'] = metadata['message_id']
+    if message_id:
+        message['Message-ID'] = message_id
     
     msg_raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
     
-    try:
-        service.users().messages().send(
+    # Sends are not idempotent, so they are never hedged.
+    sent = await deadline_service.hedged_call(
+        "gmail.send",
+        lambda: service.users().messages().send(
             userId='me', 
-            body={'raw': msg_raw, 'threadId': original_msg['threadId']}
-        ).execute()
-        return True
-    except Exception:
-        return False
+            body={'raw': msg_raw, 'threadId': metadata['thread_id']}
+        ).execute(http=gmail_http(creds)),
+        hedge=False
+    )
+    return sent.get('id')
+
+async def find_sent_message(creds: Credentials, message_id: str) -> str | None:
+    """Looks up a sent message by its Message-ID header, to confirm whether an interrupted send went out."""
+    service = build('gmail', 'v1', credentials=creds)
+    result = await deadline_service.hedged_call(
+        "gmail.list",
+        lambda: service.users().messages().list(
+            userId='me',
+            maxResults=1,
+            q=f"in:sent rfc822msgid:{message_id}"
+        ).execute(http=gmail_http(creds))
+    )
+    messages = result.get('messages', [])
+    return messages[0]['id'] if messages else None
 
 async def delete_email(creds: Credentials, email_id: str):
     service = build('gmail', 'v1', credentials=creds)
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls within one worker.
+
+    Lanes are served in priority order (first lane first), and each lane can be capped
+    below the global ceiling so lower-priority work never holds every slot. Within a lane,
+    users are served by start-time fair queueing: the user with the least weighted service
+    so far goes next, so one user's 50 summaries interleave with everyone else's.
+    """
+
+    def __init__(self, max_concurrency: int, lane_limits: dict[str, int], wait_samples: int = 1000):
+        self.max_concurrency = max_concurrency
+        self.lane_limits = lane_limits
+        self.lanes = list(lane_limits)
+        self.running = 0
+        self.lane_running = {lane: 0 for lane in self.lanes}
+        self.queues = {lane: {} for lane in self.lanes}      # user -> deque of (future, enqueued_at, cost)
+        self.virtual_time = {lane: {} for lane in self.lanes}  # user -> virtual finish time
+        self.clock = {lane: 0.0 for lane in self.lanes}
+        self.waits = {lane: deque(maxlen=wait_samples) for lane in self.lanes}
+        self.dispatched = {lane: 0 for lane in self.lanes}
+        self.max_wait = {lane: 0.0 for lane in self.lanes}
+
+    def _enqueue(self, lane: str, user_id: str, cost: float) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        queues = self.queues[lane]
+        if user_id not in queues:
+            # A user returning from idle starts at the lane clock rather than with banked credit.
+            queues[user_id] = deque()
+            self.virtual_time[lane][user_id] = max(self.virtual_time[lane].get(user_id, 0.0), self.clock[lane])
+        queues[user_id].append((future, time.monotonic(), cost))
+        return future
+
+    def _next_waiter(self, lane: str):
+        queues = self.queues[lane]
+        while queues:
+            user_id = min(queues, key=self.virtual_time[lane].__getitem__)
+            future, enqueued_at, cost = queues[user_id].popleft()
+            if not queues[user_id]:
+                del queues[user_id]
+            if future.cancelled():
+                continue
+            self.clock[lane] = self.virtual_time[lane][user_id]
+            self.virtual_time[lane][user_id] += cost
+            self._forget_idle_users(lane)
+            return future, enqueued_at
+        return None
+
+    def _forget_idle_users(self, lane: str):
+        """
+        Drops users with nothing queued whose virtual time the lane clock has caught up with.
+        They would restart at the clock anyway, so the entry only costs memory.
+        """
+        queues = self.queues[lane]
+        virtual_time = self.virtual_time[lane]
+        clock = self.clock[lane]
+        for user_id in [user for user, finish in virtual_time.items() if finish <= clock and user not in queues]:
+            del virtual_time[user_id]
+
+    def _dispatch(self):
+        while self.running < self.max_concurrency:
+            for lane in self.lanes:
+                if self.lane_running[lane] >= self.lane_limits[lane]:
+                    continue
+                waiter = self._next_waiter(lane)
+                if waiter:
+                    future, enqueued_at = waiter
+                    wait = time.monotonic() - enqueued_at
+                    self.waits[lane].append(wait)
+                    self.dispatched[lane] += 1
+                    self.max_wait[lane] = max(self.max_wait[lane], wait)
+                    self.running += 1
+                    self.lane_running[lane] += 1
+                    future.set_result(None)
+                    break
+            else:
+                return
+
+    def _release(self, lane: str):
+        self.running -= 1
+        self.lane_running[lane] -= 1
+        self._dispatch()
+
+    async def acquire(self, lane: str, user_id: str, weight: float = 1.0, timeout: float = None):
+        """
+        Waits for a slot in the given lane; the caller must release() it. A higher weight
+        gives the user a larger share. Raises TimeoutError if no slot is granted within `timeout` seconds.
+        """
+        future = self._enqueue(lane, user_id, 1.0 / weight)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if future.done() and not future.cancelled():
+                self._release(lane)
+            raise
+
+    def try_acquire(self, lane: str) -> bool:
+        """Takes a slot only if one is free and nobody is queued, e.g. for a hedged attempt."""
+        if self.running >= self.max_concurrency or self.lane_running[lane] >= self.lane_limits[lane]:
+            return False
+        if any(self.queues[queued_lane] for queued_lane in self.lanes):
+            return False
+        self.running += 1
+        self.lane_running[lane] += 1
+        return True
+
+    def release(self, lane: str):
+        self._release(lane)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, user_id: str, weight: float = 1.0, timeout: float = None):
+        """acquire() and release() around a block."""
+        await self.acquire(lane, user_id, weight, timeout)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def get_metrics(self) -> dict:
+        metrics = {}
+        for lane in self.lanes:
+            waits = sorted(self.waits[lane])
+
+            def percentile(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else 0.0
+
+            metrics[lane] = {
+                "running": self.lane_running[lane],
+                "queued": sum(len(queue) for queue in self.queues[lane].values()),
+                "dispatched": self.dispatched[lane],
+                "wait_p50_ms": percentile(0.50),
+                "wait_p95_ms": percentile(0.95),
+                "wait_max_ms": round(self.max_wait[lane] * 1000, 2)
+            }
+        return metrics
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.services import auth_service, gmail_service
+
+# Outbox document lifecycle:
+#   queued -> sending -> sent
+#                     -> queued (retried with backoff) -> ... -> failed
+# Any attempt after the first (a failed send, or a 'sending' lease that expired mid-send)
+# first checks the Sent folder for its Message-ID: Gmail may have accepted a send whose
+# response never arrived, and the reply must not go out twice.
+
+def get_outbox_collection(db):
+    return db[settings.MONGO_OUTBOX_COLLECTION_NAME]
+
+def default_idempotency_key(email_id: str, reply_body: str) -> str:
+    """Used when the client sends no Idempotency-Key: the same reply to the same email is sent once."""
+    return hashlib.sha256(f"{email_id}\n{reply_body}".encode("utf-8")).hexdigest()
+
+def make_outbox_id(user_id: str, idempotency_key: str) -> str:
+    return hashlib.sha256(f"{user_id}\n{idempotency_key}".encode("utf-8")).hexdigest()
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, in seconds, after the given number of failed attempts."""
+    delay = min(settings.OUTBOX_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), settings.OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+def public_status(doc: dict) -> dict:
+    return {
+        "outbox_id": doc["_id"],
+        "status": doc["status"],
+        "attempts": doc.get("attempts", 0),
+        "last_error": doc.get("last_error"),
+        "created_at": doc.get("created_at"),
+        "sent_at": doc.get("sent_at")
+    }
+
+async def ensure_indexes(db):
+    collection = get_outbox_collection(db)
+    await collection.create_index([("status", 1), ("next_attempt_at", 1)])
+    await collection.create_index([("user_id", 1), ("created_at", -1)])
+
+async def enqueue_reply(db, user_id: str, session_id: str, email_id: str, reply_body: str,
+                        metadata: dict | None, idempotency_key: str = None) -> dict:
+    """
+    Persists a reply for the background sender. Re-enqueueing the same key returns the existing entry.
+    With metadata=None, the sender looks up the original message before the first send.
+    """
+    collection = get_outbox_collection(db)
+    outbox_id = make_outbox_id(user_id, idempotency_key or default_idempotency_key(email_id, reply_body))
+    now = datetime.now(timezone.utc)
+
+    doc = {
+        "_id": outbox_id,
+        "user_id": user_id,
+        "session_id": session_id,
+        "email_id": email_id,
+        "reply_body": reply_body,
+        "metadata": metadata,
+        "message_id": f"<{outbox_id[:32]}@swiftmail>",
+        "status": "queued",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+    try:
+        await collection.insert_one(doc)
+        return public_status(doc)
+    except DuplicateKeyError:
+        return public_status(await collection.find_one({"_id": outbox_id}))
+
+async def get_status(db, user_id: str, outbox_id: str) -> dict | None:
+    doc = await get_outbox_collection(db).find_one({"_id": outbox_id, "user_id": user_id})
+    return public_status(doc) if doc else None
+
+async def get_replied_recipients(db, user_id: str) -> set[str]:
+    """Lowercased addresses this user has successfully replied to."""
+    recipients = await get_outbox_collection(db).distinct("metadata.recipient", {"user_id": user_id, "status": "sent"})
+    return {recipient.lower() for recipient in recipients if recipient}
+
+async def claim_next(db) -> dict | None:
+    """Atomically leases the next due entry. Returns the document as it was before the claim."""
+    now = datetime.now(timezone.utc)
+    return await get_outbox_collection(db).find_one_and_update(
+        {"$or": [
+            {"status": "queued", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "lease_until": {"$lte": now}}
+        ]},
+        {
+            "$set": {"status": "sending", "lease_until": now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.BEFORE
+    )
+
+async def process_entry(db, doc: dict):
+    collection = get_outbox_collection(db)
+    attempts = doc.get("attempts", 0) + 1
+
+    try:
+        creds_data = await auth_service.load_and_refresh_tokens_from_db(db, doc["session_id"])
+        if not creds_data:
+            await collection.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"status": "failed", "last_error": "Session expired before the reply could be sent."}, "$unset": {"lease_until": ""}}
+            )
+            return
+        creds, _ = creds_data
+
+        # Replies enqueued on a worker without cached metadata are resolved here, once.
+        metadata = doc.get("metadata")
+        if not metadata:
+            metadata = await gmail_service.get_reply_metadata(creds, doc["user_id"], doc["email_id"])
+            if not metadata:
+                await collection.update_one(
+                    {"_id": doc["_id"]},
+                    {"$set": {"status": "failed", "last_error": "Original email not found or has no sender to reply to."}, "$unset": {"lease_until": ""}}
+                )
+                return
+            await collection.update_one({"_id": doc["_id"]}, {"$set": {"metadata": metadata}})
+
+        sent_id = None
+        if attempts > 1:
+            sent_id = await gmail_service.find_sent_message(creds, doc["message_id"])
+        if not sent_id:
+            sent_id = await gmail_service.send_prepared_reply(creds, metadata, doc["reply_body"], doc["message_id"])
+
+        await collection.update_one(
+            {"_id": doc["_id"]},
+            {"$set": {"status": "sent", "sent_at": datetime.now(timezone.utc), "gmail_message_id": sent_id, "last_error": None}, "$unset": {"lease_until": ""}}
+        )
+    except Exception as e:
+        print(f"[outbox_service] Send attempt {attempts} for {doc['_id'][:10]} failed: {e}")
+        if attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            update = {"status": "failed", "last_error": str(e)}
+        else:
+            next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=backoff_delay(attempts))
+            update = {"status": "queued", "next_attempt_at": next_attempt_at, "last_error": str(e)}
+        await collection.update_one({"_id": doc["_id"]}, {"$set": update, "$unset": {"lease_until": ""}})
+
+async def drain_once(db) -> bool:
+    """Sends at most one due entry. Returns False when nothing was due."""
+    doc = await claim_next(db)
+    if not doc:
+        return False
+    await process_entry(db, doc)
+    return True
+
+async def run_sender(db):
+    """Background loop started with the app. Every worker runs one; claims are atomic in MongoDB."""
+    await ensure_indexes(db)
+    while True:
+        try:
+            if not await drain_once(db):
+                await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[outbox_service] Sender loop error: {e}")
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
@@ -0,0 +1,255 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import re
+import secrets
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, deque
+from app.config import settings
+
+# Opt-in profiling for live workers. Nothing here runs unless an admin asks for it (or
+# LOOP_BLOCK_MONITOR is set), so it stays compiled in. Outputs are files under PROFILE_DIR,
+# shared by the workers on a host:
+#   <id>.pstats     cProfile of a single request (snakeviz, flameprof, gprof2dot)
+#   <id>.collapsed  sampled stacks of every thread, in collapsed format (flamegraph.pl, speedscope)
+
+PROFILE_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}\.(pstats|collapsed)$")
+
+_request_profile_lock = threading.Lock()
+
+
+def new_profile_path(extension: str) -> tuple[str, str]:
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = f"{uuid.uuid4().hex}.{extension}"
+    return name, os.path.join(settings.PROFILE_DIR, name)
+
+
+def prune_profiles():
+    """Keeps only the newest PROFILE_MAX_FILES outputs."""
+    names = list_profiles()
+    for entry in names[settings.PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, entry["name"]))
+        except OSError:
+            pass
+
+
+def list_profiles() -> list[dict]:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(settings.PROFILE_DIR):
+        if PROFILE_NAME_PATTERN.match(name):
+            stat = os.stat(os.path.join(settings.PROFILE_DIR, name))
+            entries.append({"name": name, "size": stat.st_size, "created_at": stat.st_mtime})
+    return sorted(entries, key=lambda entry: entry["created_at"], reverse=True)
+
+
+def profile_path(name: str) -> str | None:
+    """Resolves a downloadable profile by name; None for unknown or malformed names."""
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.exists(path) else None
+
+
+def pstats_as_text(path: str, limit: int = 60) -> str:
+    stream = io.StringIO()
+    pstats.Stats(path, stream=stream).sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def is_admin_token(token: str | None) -> bool:
+    return bool(settings.ADMIN_TOKEN and token and secrets.compare_digest(token, settings.ADMIN_TOKEN))
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under cProfile when it carries a valid X-Admin-Token plus either an
+    X-Profile: 1 header or a ?profile=1 query flag. The profile covers the event-loop
+    thread while the request runs, so concurrent requests on the same worker show up too.
+    The response carries X-Profile-Id, downloadable from the admin profiling endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers", []))
+        flagged = headers.get(b"x-profile") == b"1" or b"profile=1" in scope.get("query_string", b"").split(b"&")
+        if not flagged:
+            return False
+        token = headers.get(b"x-admin-token")
+        return is_admin_token(token.decode("latin-1") if token else None)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        # Only one cProfile can be active per thread; a second request runs unprofiled.
+        if not _request_profile_lock.acquire(blocking=False):
+            return await self.app(scope, receive, self._with_header(send, b"x-profile-status", b"busy"))
+
+        name, path = new_profile_path("pstats")
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, self._with_header(send, b"x-profile-id", name.encode()))
+            finally:
+                profiler.disable()
+            profiler.dump_stats(path)
+            prune_profiles()
+        finally:
+            _request_profile_lock.release()
+
+    @staticmethod
+    def _with_header(send, key: bytes, value: bytes):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (key, value)]}
+            await send(message)
+        return wrapped
+
+
+class StackSampler:
+    """Samples the stacks of every thread in the worker and writes them in collapsed format."""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self.started_at = None
+        self.ends_at = None
+        self.interval = None
+        self.samples = 0
+        self.last_output = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float, interval: float) -> bool:
+        if self.running:
+            return False
+        self._stop.clear()
+        self.started_at = time.time()
+        self.ends_at = self.started_at + duration
+        self.interval = interval
+        self.samples = 0
+        self._thread = threading.Thread(target=self._run, args=(duration, interval), name="stack-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self, duration: float, interval: float):
+        stacks = Counter()
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stacks[";".join([names.get(thread_id, str(thread_id)), *reversed(frames)])] += 1
+            self.samples += 1
+            self._stop.wait(interval)
+
+        name, path = new_profile_path("collapsed")
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        self.last_output = name
+        prune_profiles()
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "ends_at": self.ends_at,
+            "interval_ms": None if self.interval is None else self.interval * 1000,
+            "samples": self.samples,
+            "output": self.last_output
+        }
+
+
+class LoopBlockMonitor:
+    """
+    Detects event-loop stalls. A heartbeat task ticks on the loop; a watchdog thread notices
+    when a tick is overdue by more than the threshold and captures the loop thread's stack
+    while it is still blocked, which is the code responsible.
+    """
+
+    def __init__(self, threshold_ms: float, max_events: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.events = deque(maxlen=max_events)
+        self._heartbeat_task = None
+        self._stop = threading.Event()
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop = threading.Event()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, args=(self._stop,), name="loop-block-monitor", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _watch(self, stop: threading.Event):
+        current = None
+        while not stop.wait(self.threshold / 4):
+            lag = time.monotonic() - self._last_beat - self.threshold / 4
+            if lag > self.threshold:
+                if current is None:
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    current = {
+                        "at": time.time(),
+                        "blocked_ms": round(lag * 1000, 1),
+                        "stack": traceback.format_stack(frame) if frame is not None else []
+                    }
+                    self.events.append(current)
+                else:
+                    current["blocked_ms"] = round(lag * 1000, 1)
+            else:
+                current = None
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "threshold_ms": self.threshold * 1000,
+            "events": list(self.events)
+        }
+
+
+stack_sampler = StackSampler()
+loop_monitor = LoopBlockMonitor(settings.LOOP_BLOCK_THRESHOLD_MS)
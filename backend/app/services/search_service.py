@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.services import ai_service, deadline_service
+
+# One index per user, cached per worker. Each index is an append-only pair of files:
+#   vectors.f32  - raw float32 rows of L2-normalized embeddings (memory-mapped for queries)
+#   meta.jsonl   - one {"id", "sender", "date", "subject"} line per row, in the same order
+# Appends from several workers are serialized with an flock on a sibling lock file.
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class MailboxIndex:
+    def __init__(self, user_id: str, dimensions: int = None):
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSIONS
+        user_key = hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32]
+        self.path = os.path.join(settings.VECTOR_INDEX_DIR, f"{user_key}-{self.dimensions}")
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.meta_path = os.path.join(self.path, "meta.jsonl")
+        self.lock_path = os.path.join(self.path, ".lock")
+
+        self.ids = []
+        self.row_by_id = {}
+        self.senders = []
+        self.sender_codes = {}
+        self._codes = []
+        self._dates = []
+        self._headers = []
+        self._filter_arrays = None
+        self.meta_offset = 0
+        self._lock = threading.Lock()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return not self.ids
+
+    def _refresh(self):
+        """Loads metadata lines appended since the last refresh (possibly by another worker)."""
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path, "rb") as f:
+            f.seek(self.meta_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # A partial line from an in-progress append.
+                self.meta_offset += len(line)
+                meta = json.loads(line)
+                sender = (meta.get("sender") or "").lower()
+                if sender not in self.sender_codes:
+                    self.sender_codes[sender] = len(self.senders)
+                    self.senders.append(sender)
+                self.row_by_id[meta["id"]] = len(self.ids)
+                self.ids.append(meta["id"])
+                self._codes.append(self.sender_codes[sender])
+                self._dates.append(meta.get("date") or 0)
+                self._headers.append((meta.get("sender") or "", meta.get("subject") or ""))
+
+    def _filter_columns(self, rows: int) -> tuple[np.ndarray, np.ndarray]:
+        """Sender codes and dates as arrays, rebuilt only when the index has grown."""
+        if self._filter_arrays is None or len(self._filter_arrays[0]) != rows:
+            self._filter_arrays = (
+                np.asarray(self._codes[:rows], dtype=np.int32),
+                np.asarray(self._dates[:rows], dtype=np.int64)
+            )
+        return self._filter_arrays
+
+    def _vectors(self) -> np.ndarray:
+        row_bytes = self.dimensions * 4
+        rows = min(len(self.ids), os.path.getsize(self.vectors_path) // row_bytes) if os.path.exists(self.vectors_path) else 0
+        if rows == 0:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dimensions))
+
+    def sender_counts(self) -> dict[str, int]:
+        """Indexed messages per lowercased From header."""
+        with self._lock:
+            self._refresh()
+            counts = np.bincount(np.asarray(self._codes, dtype=np.int64), minlength=len(self.senders))
+            return dict(zip(self.senders, counts.tolist()))
+
+    def describe(self, email_id: str) -> dict | None:
+        """The sender and subject an indexed message was stored with, for showing what a search matched."""
+        with self._lock:
+            self._refresh()
+            row = self.row_by_id.get(email_id)
+            if row is None:
+                return None
+            sender, subject = self._headers[row]
+            return {"sender": sender, "subject": subject}
+
+    def missing_ids(self, ids: list[str]) -> list[str]:
+        with self._lock:
+            self._refresh()
+            return [email_id for email_id in ids if email_id not in self.row_by_id]
+
+    def add(self, ids: list[str], vectors: np.ndarray, senders: list[str], dates: list[int],
+            subjects: list[str] = None):
+        """Appends rows for message ids that are not indexed yet."""
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                seen = set(self.row_by_id)
+                keep = []
+                for i, email_id in enumerate(ids):
+                    if email_id not in seen:
+                        seen.add(email_id)
+                        keep.append(i)
+                if not keep:
+                    return
+
+                # Vectors first: readers only trust rows that also have a metadata line.
+                # Rows left over from an interrupted append are cut off before writing.
+                rows = np.ascontiguousarray(vectors[keep], dtype=np.float32)
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(len(self.ids) * self.dimensions * 4)
+                    f.write(rows.tobytes())
+                with open(self.meta_path, "ab") as f:
+                    f.write(b"".join(
+                        json.dumps({
+                            "id": ids[i], "sender": senders[i], "date": dates[i],
+                            "subject": subjects[i] if subjects else ""
+                        }).encode("utf-8") + b"\n"
+                        for i in keep
+                    ))
+                self._refresh()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5, sender: str = None,
+               after: int = None, before: int = None) -> list[tuple[str, float]]:
+        """
+        Returns up to top_k (message_id, cosine_score) pairs, best first.
+        'sender' is a case-insensitive substring of the From header; 'after' and
+        'before' bound the message date in epoch milliseconds.
+        """
+        with self._lock:
+            self._refresh()
+            vectors = self._vectors()
+            rows = len(vectors)
+            if rows == 0:
+                return []
+            scores = vectors @ query_vector.astype(np.float32).ravel()
+
+            mask = None
+            sender_codes, dates = self._filter_columns(rows)
+            if sender:
+                needle = sender.lower()
+                codes = [code for code, name in enumerate(self.senders) if needle in name]
+                mask = np.isin(sender_codes, codes)
+            if after is not None or before is not None:
+                date_mask = np.ones(rows, dtype=bool)
+                if after is not None:
+                    date_mask &= dates >= after
+                if before is not None:
+                    date_mask &= dates < before
+                mask = date_mask if mask is None else mask & date_mask
+            if mask is not None:
+                scores = np.where(mask, scores, -np.inf)
+
+            top_k = min(top_k, rows)
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+def get_index(user_id: str) -> MailboxIndex:
+    with _indexes_lock:
+        if user_id not in _indexes:
+            _indexes[user_id] = MailboxIndex(user_id)
+        return _indexes[user_id]
+
+
+def email_to_text(email: dict) -> str:
+    text = f"From: {email.get('sender', '')}\nSubject: {email.get('subject', '')}\n{email.get('body') or email.get('snippet') or ''}"
+    return text[:settings.EMBEDDING_MAX_CHARS]
+
+
+async def index_emails(user_id: str, emails: list[dict]):
+    """
+    Embeds and indexes fetched emails that are not indexed yet. Runs as a background task,
+    after the response: embeddings go through the bulk lane without the request's deadline.
+    """
+    index = get_index(user_id)
+    missing = set(await run_in_threadpool(index.missing_ids, [email["id"] for email in emails]))
+    emails = [email for email in emails if email["id"] in missing]
+    if not emails:
+        return
+
+    token = deadline_service.clear_deadline()
+    try:
+        vectors = await ai_service.embed([email_to_text(email) for email in emails], ai_service.BULK_LANE, user_id)
+        await run_in_threadpool(
+            index.add,
+            [email["id"] for email in emails],
+            vectors,
+            [email.get("sender", "") for email in emails],
+            [email.get("date") or 0 for email in emails],
+            [email.get("subject", "") for email in emails]
+        )
+    except Exception as e:
+        print(f"[search_service] Failed to index {len(emails)} emails: {e}")
+    finally:
+        deadline_service.reset_deadline(token)
+
+
+async def semantic_search(user_id: str, query: str, sender: str = None, after: int = None,
+                          before: int = None, top_k: int = 5) -> list[tuple[str, float]]:
+    """
+    Returns (message_id, score) pairs above SEMANTIC_SEARCH_MIN_SCORE, best first.
+    The query is embedded in the interactive lane, under the request deadline.
+    """
+    index = get_index(user_id)
+    if await run_in_threadpool(index.is_empty):
+        return []
+
+    query_vector = (await ai_service.embed([query], ai_service.INTERACTIVE_LANE, user_id, task_type="RETRIEVAL_QUERY"))[0]
+    results = await run_in_threadpool(index.search, query_vector, top_k=top_k, sender=sender, after=after, before=before)
+    return [(email_id, score) for email_id, score in results if score >= settings.SEMANTIC_SEARCH_MIN_SCORE]
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+from app.config import settings
+
+# The last email listing shown to each session, so "reply to the 3rd one" resolves without
+# a Gmail search. One small document per session in MongoDB keeps it shared across workers;
+# a TTL index removes expired listings.
+
+# Enough of each email to resolve it by number and to build a reply without refetching it.
+LISTING_FIELDS = ("id", "sender", "subject", "thread_id", "message_id")
+
+def get_listing_collection(db):
+    return db[settings.MONGO_SESSION_CACHE_COLLECTION_NAME]
+
+async def ensure_indexes(db):
+    await get_listing_collection(db).create_index("expires_at", expireAfterSeconds=0)
+
+async def save_listing(db, session_id: str, emails: list[dict]):
+    """Replaces the session's listing with the given emails, in display order."""
+    listing = [
+        {field: email.get(field) for field in LISTING_FIELDS}
+        for email in emails[:settings.SESSION_CACHE_MAX_EMAILS]
+    ]
+    await get_listing_collection(db).replace_one(
+        {"_id": session_id},
+        {
+            "_id": session_id,
+            "emails": listing,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=settings.SESSION_CACHE_TTL_SECONDS)
+        },
+        upsert=True
+    )
+
+async def get_listed_email(db, session_id: str, email_number: int) -> dict | None:
+    """Returns the 1-based email_number from the session's last listing, or None if absent or expired."""
+    if not session_id or not email_number or email_number < 1:
+        return None
+
+    # The TTL monitor only runs about once a minute, so expiry is checked here too.
+    doc = await get_listing_collection(db).find_one(
+        {"_id": session_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"emails": {"$slice": [email_number - 1, 1]}}
+    )
+    if not doc or not doc.get("emails"):
+        return None
+    return doc["emails"][0]
+
+async def get_listed_email_by_id(db, session_id: str, email_id: str) -> dict | None:
+    """Returns the email with the given id from the session's last listing, or None."""
+    if not session_id or not email_id:
+        return None
+
+    doc = await get_listing_collection(db).find_one(
+        {"_id": session_id, "expires_at": {"$gt": datetime.now(timezone.utc)}, "emails.id": email_id},
+        {"emails.$": 1}
+    )
+    if not doc or not doc.get("emails"):
+        return None
+    return doc["emails"][0]
@@ -0,0 +1,107 @@
+import re
+import time
+from collections import OrderedDict
+import numpy as np
+from app.config import settings
+
+# Cheap local triage: each email becomes a row of features, and the score is one matrix-vector
+# product over the whole batch. Per-feature contributions double as the explanation.
+
+URGENT_PATTERN = re.compile(
+    r"\b(urgent|asap|action required|deadline|due|overdue|invoice|payment|meeting|interview|contract|reminder)\b",
+    re.IGNORECASE
+)
+NO_REPLY_PATTERN = re.compile(r"no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?@|mailer-daemon", re.IGNORECASE)
+ADDRESS_PATTERN = re.compile(r"<(.*?)>")
+
+# (feature, weight, explanation shown to the user)
+FEATURES = [
+    ("important", 2.0, "Marked important or starred"),
+    ("unread", 0.5, "Unread"),
+    ("replied_before", 2.0, "You have replied to this sender"),
+    ("urgent_keywords", 0.75, "Mentions deadlines, payments or meetings"),
+    ("frequent_sender", -0.5, "Sends you a lot of mail"),
+    ("promotions_social", -1.5, "Promotions or social category"),
+    ("updates_forums", -0.75, "Updates or forums category"),
+    ("list_unsubscribe", -1.0, "Mailing list (has List-Unsubscribe)"),
+    ("bulk_precedence", -0.75, "Sent as bulk mail"),
+    ("no_reply_sender", -1.0, "Sent from a no-reply address"),
+]
+FEATURE_NAMES = [name for name, _, _ in FEATURES]
+WEIGHTS = np.array([weight for _, weight, _ in FEATURES], dtype=np.float32)
+
+# (user_id, message_id) -> (expires_at, triage dict)
+_score_cache = OrderedDict()
+
+
+def sender_address(sender: str) -> str:
+    match = ADDRESS_PATTERN.search(sender or "")
+    return (match.group(1) if match else sender or "").strip().lower()
+
+
+def feature_matrix(emails: list[dict], replied_to: set[str], sender_counts: dict[str, int]) -> np.ndarray:
+    """Builds the (emails x FEATURES) matrix. Columns follow FEATURE_NAMES."""
+    labels = [set(email.get("labels") or ()) for email in emails]
+    senders = [email.get("sender") or "" for email in emails]
+    addresses = [sender_address(sender) for sender in senders]
+    counts = np.array([sender_counts.get(sender.lower(), 0) for sender in senders], dtype=np.float32)
+
+    columns = {
+        "important": [bool(label_set & {"IMPORTANT", "STARRED"}) for label_set in labels],
+        "unread": ["UNREAD" in label_set for label_set in labels],
+        "replied_before": [address in replied_to for address in addresses],
+        "urgent_keywords": [
+            min(len(URGENT_PATTERN.findall(f"{email.get('subject', '')} {email.get('snippet') or ''}")), 3) / 3
+            for email in emails
+        ],
+        "frequent_sender": np.minimum(np.log1p(counts) / np.log1p(settings.TRIAGE_FREQUENT_SENDER_COUNT), 1.0),
+        "promotions_social": [bool(label_set & {"CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL"}) for label_set in labels],
+        "updates_forums": [bool(label_set & {"CATEGORY_UPDATES", "CATEGORY_FORUMS"}) for label_set in labels],
+        "list_unsubscribe": [bool(email.get("list_unsubscribe")) for email in emails],
+        "bulk_precedence": [(email.get("precedence") or "").lower() in ("bulk", "list", "junk") for email in emails],
+        "no_reply_sender": [bool(NO_REPLY_PATTERN.search(address)) for address in addresses],
+    }
+    return np.column_stack([np.asarray(columns[name], dtype=np.float32) for name in FEATURE_NAMES])
+
+
+def explain(contributions: np.ndarray) -> list[str]:
+    order = np.argsort(-np.abs(contributions), kind="stable")
+    return [
+        f"{FEATURES[i][2]} ({contributions[i]:+.2f})"
+        for i in order if contributions[i] != 0
+    ]
+
+
+def score_emails(user_id: str, emails: list[dict], replied_to: set[str], sender_counts: dict[str, int]) -> list[dict]:
+    """
+    Returns a {"score", "reasons"} dict per email, in input order. Results are cached per
+    message for TRIAGE_CACHE_TTL_SECONDS; only uncached messages are scored.
+    """
+    now = time.monotonic()
+    results = [None] * len(emails)
+    missing = []
+    for i, email in enumerate(emails):
+        cached = _score_cache.get((user_id, email["id"]))
+        if cached and cached[0] > now:
+            results[i] = cached[1]
+        else:
+            missing.append(i)
+
+    if missing:
+        matrix = feature_matrix([emails[i] for i in missing], replied_to, sender_counts)
+        contributions = matrix * WEIGHTS
+        scores = contributions.sum(axis=1)
+        for row, i in enumerate(missing):
+            triage = {"score": round(float(scores[row]), 2), "reasons": explain(contributions[row])}
+            results[i] = triage
+            _score_cache[(user_id, emails[i]["id"])] = (now + settings.TRIAGE_CACHE_TTL_SECONDS, triage)
+            _score_cache.move_to_end((user_id, emails[i]["id"]))
+        while len(_score_cache) > settings.TRIAGE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+
+    return results
+
+
+def rank(triage: list[dict]) -> list[int]:
+    """Indices ordered by descending score; ties keep Gmail's (most recent first) order."""
+    return np.argsort(-np.array([t["score"] for t in triage], dtype=np.float32), kind="stable").tolist()
@@ -2,7 +2,8 @@ import pytest
 import asyncio
 import json
 from unittest.mock import AsyncMock, patch
-from app.services.ai_service import parse_user_intent
+from app.config import settings
+from app.services.ai_service import parse_user_intent, generate_summary, choose_model_strategy, count_quoted_replies
 
 # Use a mock client response to ensure the test doesn't actually call the Gemini API
 @pytest.mark.asyncio
@@ -54,4 +55,115 @@ async def test_parse_user_intent_unknown(mock_client):
     intent = await parse_user_intent(command)
 
     assert intent['action'] == 'unknown'
-    assert intent['params'] == {}
\ No newline at end of file
+    assert intent['params'] == {}
+
+@pytest.mark.asyncio
+@patch('app.services.ai_service.client')
+async def test_generate_summary_short_body_skips_llm(mock_client):
+    """A one-line email is summarized by its first sentence without calling Gemini."""
+    summary = await generate_summary("Lunch moved to 1pm. See you there!")
+
+    assert summary == "Lunch moved to 1pm."
+    mock_client.models.generate_content.assert_not_called()
+
+@pytest.mark.asyncio
+@patch('app.services.ai_service.client')
+async def test_generate_summary_routes_by_length(mock_client):
+    """Medium bodies use the light model, long bodies use the full model."""
+    mock_response = AsyncMock()
+    mock_response.text = "Summary."
+    mock_client.models.generate_content.return_value = mock_response
+
+    await generate_summary("Please review the attached budget proposal. " * 20)
+    assert mock_client.models.generate_content.call_args.kwargs['model'] == settings.GEMINI_LIGHT_MODEL
+
+    await generate_summary("Please review the attached budget proposal. " * 200)
+    assert mock_client.models.generate_content.call_args.kwargs['model'] == settings.GEMINI_MODEL
+
+def test_choose_model_strategy_quoted_thread():
+    """Threads with several quoted replies go to the full model even when short."""
+    thread = (
+        "Sounds good.\n\n"
+        "On Mon, Jan 5, 2026 at 9:00 AM Alice wrote:\n> Can we ship Friday?\n\n"
+        "On Sun, Jan 4, 2026 at 8:00 PM Bob wrote:\n> Is the release ready?"
+    )
+    assert choose_model_strategy(thread) == "full"
+    assert choose_model_strategy("") == "extract"
+    assert choose_model_strategy("Short note.", allow_extract=False) == "light"
+
+def test_single_reply_thread_routes_to_light():
+    """One quoted reply counts once, however many '>' lines it has."""
+    thread = (
+        "Friday works for me.\n\n"
+        "On Mon, Jan 5, 2026 at 9:00 AM Alice <alice@example.com> wrote:\n"
+        "> Can we ship Friday?\n"
+        "> The release notes are ready."
+    )
+    assert count_quoted_replies(thread) == 1
+    assert choose_model_strategy(thread) == "light"
+
+
+def test_count_quoted_replies_header_styles():
+    outlook = (
+        "See below.\n\n"
+        "From: Bob <bob@example.com>\nSent: Monday, January 5, 2026 9:00 AM\nTo: Alice\nSubject: Release\n\n"
+        "Is the release ready?\n\n"
+        "-----Original Message-----\nFrom: Carol\nDate: Sunday\n\nPing."
+    )
+    wrapped = "Thanks!\n\nOn Mon, Jan 5, 2026 at 9:00 AM Alice <\nalice@example.com> wrote:\n> Hi\n\n> Bare quote"
+    assert count_quoted_replies(outlook) == 2
+    assert count_quoted_replies(wrapped) == 2
+    assert count_quoted_replies("Plain note.\nFrom: the team") == 0
+
+
+@pytest.mark.asyncio
+async def test_abandoned_and_hedged_calls_keep_their_slots():
+    """Calls in flight never exceed the scheduler ceiling, even after a hedge or a deadline."""
+    import threading
+    import time
+    from app.services import ai_service, deadline_service
+    from app.services.llm_scheduler import LLMScheduler
+
+    in_flight = []
+    lock = threading.Lock()
+
+    def slow_then_fast():
+        with lock:
+            in_flight.append(1)
+            first = len(in_flight) == 1
+        time.sleep(0.3 if first else 0.01)
+        return "done"
+
+    tracker = deadline_service.LatencyTracker(window=100, min_samples=5, max_hedge_ratio=1.0)
+    for _ in range(10):
+        tracker.record("gemini.test", 0.02)
+    scheduler = LLMScheduler(2, {"interactive": 2, "bulk": 2})
+
+    with patch.object(ai_service, 'llm_scheduler', scheduler), patch.object(deadline_service, 'latency_tracker', tracker):
+        # The hedge wins; the first attempt is still running and still holds a slot.
+        assert await ai_service.admitted_call("interactive", "u", "gemini.test", slow_then_fast) == "done"
+        assert len(in_flight) == 2
+        await asyncio.sleep(0.05)  # Slots are released from task callbacks.
+        assert scheduler.running == 1
+        await asyncio.sleep(0.4)
+        assert scheduler.running == 0
+
+        # With one slot, the hedge is not admitted.
+        scheduler.max_concurrency = 1
+        in_flight.clear()
+        await ai_service.admitted_call("interactive", "u", "gemini.test", slow_then_fast)
+        await asyncio.sleep(0.05)
+        assert len(in_flight) == 1
+        assert scheduler.running == 0
+
+        # A deadline abandons the call, but its slot is held until the thread returns.
+        token = deadline_service.set_deadline(0.05)
+        try:
+            in_flight.clear()
+            with pytest.raises(deadline_service.DeadlineExceeded):
+                await ai_service.admitted_call("interactive", "u", "gemini.new", slow_then_fast)
+        finally:
+            deadline_service.reset_deadline(token)
+        assert scheduler.running == 1
+        await asyncio.sleep(0.4)
+        assert scheduler.running == 0
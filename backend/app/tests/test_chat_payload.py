@@ -0,0 +1,176 @@
+import pytest
+import orjson
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models.chat import CommandRequest
+from app.services import deadline_service
+from app.routers.chat import handle_chatbot_command, select_email_fields
+
+# --- MOCK DATA SETUP ---
+
+MOCK_BODY = "Hello team, please find the quarterly report attached. " * 80
+
+MOCK_EMAILS = [
+    {
+        "id": f"mock_msg_id_{i}",
+        "sender": "Reports <reports@example.com>",
+        "subject": f"Quarterly report #{i}",
+        "body": MOCK_BODY,
+        "snippet": MOCK_BODY[:200],
+    }
+    for i in range(50)
+]
+
+COMPACT_FIELDS = ["id", "sender", "subject", "summary"]
+
+
+async def run_read(fields, emails=MOCK_EMAILS):
+    """Runs a 50-email read through the command handler with Gmail and Gemini mocked out."""
+    with patch('app.routers.chat.ai_service') as mock_ai, patch('app.routers.chat.gmail_service') as mock_gmail, \
+            patch('app.routers.chat.session_cache_service') as mock_cache, \
+            patch('app.routers.chat.search_service') as mock_search, \
+            patch.dict('app.services.triage_service._score_cache', clear=True):
+        mock_ai.parse_user_intent = AsyncMock(return_value={"action": "read", "params": {"count": len(emails)}})
+        mock_ai.generate_summary = AsyncMock(return_value="Quarterly report shared; no action needed.")
+        mock_gmail.fetch_latest_emails = AsyncMock(return_value=emails)
+        mock_search.get_index.return_value.sender_counts.return_value = {}
+        mock_cache.save_listing = AsyncMock()
+
+        result = await handle_chatbot_command(
+            MagicMock(),
+            CommandRequest(command="Read my last 50 emails", fields=fields),
+            background_tasks=MagicMock(),
+            creds_tuple=(object(), "Test User"),
+            user_id="test@example.com",
+            session_id="session123"
+        )
+        return result, mock_ai
+
+
+def test_select_email_fields_keeps_id():
+    """The message id is always returned so the UI can fetch the body later."""
+    email = select_email_fields(MOCK_EMAILS[0], ["subject"])
+    assert email == {"id": "mock_msg_id_0", "subject": "Quarterly report #0"}
+    assert select_email_fields({**MOCK_EMAILS[0], "labels": ["INBOX"]}, None) == MOCK_EMAILS[0]
+
+
+@pytest.mark.asyncio
+async def test_read_defaults_to_full_payload():
+    """Every public field is returned; headers kept for triage and replies are not."""
+    emails = [
+        {**email, "labels": ["INBOX"], "list_unsubscribe": "<mailto:u@example.com>",
+         "precedence": "bulk", "message_id": "<m@example.com>"}
+        for email in MOCK_EMAILS
+    ]
+    result, _ = await run_read(None, emails)
+    email = result["data"]["emails"][0]
+    assert set(email) == {"id", "sender", "subject", "body", "snippet", "summary", "triage"}
+
+
+@pytest.mark.asyncio
+async def test_compact_read_payload_for_50_emails():
+    """Summary-only reads of 50 emails should be a small fraction of the full payload."""
+    full, _ = await run_read(None)
+    compact, _ = await run_read(COMPACT_FIELDS)
+
+    full_size = len(orjson.dumps(full))
+    compact_size = len(orjson.dumps(compact))
+
+    assert len(compact["data"]["emails"]) == 50
+    assert "body" not in compact["data"]["emails"][0]
+    assert compact_size * 10 < full_size
+
+
+@pytest.mark.asyncio
+async def test_read_without_summary_skips_ai():
+    result, mock_ai = await run_read(["id", "subject", "snippet"])
+    mock_ai.generate_summary.assert_not_called()
+    assert "summary" not in result["data"]["emails"][0]
+    assert "summarized" not in result["response"]
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_reads_are_summarized_once():
+    """50 reports differing only in their number produce one summary call and one group."""
+    with patch.dict('app.services.dedup_service._recent_summaries', clear=True):
+        result, mock_ai = await run_read(None)
+
+    assert mock_ai.generate_summary.call_count == 1
+    listed = result["data"]["emails"]
+    assert listed[0]["summary"] == "Quarterly report shared; no action needed."
+    assert {email["summary"] for email in listed[1:]} == {f"Similar to #1: {MOCK_EMAILS[0]['snippet']}"}
+    assert result["data"]["groups"][0]["label"] == "50 similar emails from Reports"
+    assert result["data"]["groups"][0]["details_differ"] is True
+
+
+@pytest.mark.asyncio
+async def test_read_degrades_to_snippets_when_budget_runs_out():
+    token = deadline_service.set_deadline(0.1)
+    try:
+        with patch.dict('app.services.dedup_service._recent_summaries', clear=True):
+            result, mock_ai = await run_read(None)
+    finally:
+        deadline_service.reset_deadline(token)
+
+    mock_ai.generate_summary.assert_not_called()
+    assert result["data"]["degraded"] is True
+    assert result["data"]["emails"][0]["summary"] == MOCK_EMAILS[0]["snippet"]
+
+
+@pytest.mark.asyncio
+async def test_read_orders_by_triage_and_summarizes_top_k():
+    """Only the top-K triaged emails reach the LLM; the rest fall back to their snippets."""
+    emails = [
+        {
+            "id": f"distinct_{i}",
+            "sender": f"Sender {i} <sender{i}@example.com>",
+            "subject": f"Topic {i}",
+            "body": " ".join(f"{word}{'abcdefghijkl'[i]}" for word in MOCK_BODY.split()[:40]),
+            "snippet": f"Snippet {i}",
+            "labels": ["CATEGORY_PROMOTIONS"],
+        }
+        for i in range(12)
+    ]
+    emails[7] = {**emails[7], "labels": ["IMPORTANT", "UNREAD"]}
+
+    with patch('app.routers.chat.settings.TRIAGE_SUMMARY_TOP_K', 3), \
+            patch.dict('app.services.dedup_service._recent_summaries', clear=True):
+        result, mock_ai = await run_read(None, emails)
+
+    listed = result["data"]["emails"]
+    assert listed[0]["id"] == "distinct_7"
+    assert mock_ai.generate_summary.call_count == 3
+    assert [email["triage"]["summarized"] for email in listed] == [True] * 3 + [False] * 9
+    assert listed[-1]["summary"] == listed[-1]["snippet"]
+    assert "Marked important or starred (+2.00)" in listed[0]["triage"]["reasons"]
+
+
+DECISION_BODY = (
+    "Hello {name}, thank you for submitting your expense report for the October offsite in Lisbon. "
+    "After review by the finance team, your request has been {decision}. You can see the full details "
+    "of the decision in the expenses portal under your reports tab. If you have any questions about this "
+    "outcome please reply to this message and a member of the finance team will follow up with you shortly."
+)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("other", [
+    {"name": "Alice Johnson", "decision": "rejected"},
+    {"name": "Robert Smith", "decision": "approved"},
+])
+async def test_near_duplicates_never_share_a_summary(other):
+    """A summary is only copied between identical emails; near-duplicates show their own snippet."""
+    emails = [
+        {"id": f"dec{i}", "sender": "Finance <finance@acme.example>", "subject": "Expense report decision",
+         "body": DECISION_BODY.format(**fields), "snippet": f"Hello {fields['name']}, your request has been {fields['decision']}."}
+        for i, fields in enumerate(({"name": "Alice Johnson", "decision": "approved"}, other))
+    ]
+    identical = {**emails[0], "id": "dec2"}
+    with patch.dict('app.services.dedup_service._recent_summaries', clear=True):
+        result, mock_ai = await run_read(None, [*emails, identical])
+
+    assert mock_ai.generate_summary.call_count == 1
+    listed = {email["id"]: email for email in result["data"]["emails"]}
+    assert listed["dec0"]["summary"] == listed["dec2"]["summary"] == "Quarterly report shared; no action needed."
+    assert listed["dec1"]["summary"] == f"Similar to #1: {emails[1]['snippet']}"
+    assert listed["dec1"]["triage"]["summarized"] is False
+    assert result["data"]["groups"][0]["count"] == 3
@@ -0,0 +1,83 @@
+import time
+import pytest
+from unittest.mock import patch
+from app.services import deadline_service
+from app.services.deadline_service import DeadlineExceeded, LatencyTracker, hedged_call
+
+
+@pytest.fixture
+def tracker():
+    """A latency tracker whose observed p95 for 'slow.call' is 50 ms."""
+    tracker = LatencyTracker(window=100, min_samples=5, max_hedge_ratio=1.0)
+    for _ in range(10):
+        tracker.record("slow.call", 0.05)
+    with patch.object(deadline_service, 'latency_tracker', tracker):
+        yield tracker
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_first_result_wins(tracker):
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        # The first attempt is stuck well past p95; the hedge returns quickly.
+        time.sleep(0.5 if len(attempts) == 1 else 0.01)
+        return len(attempts)
+
+    start = time.monotonic()
+    result = await hedged_call("slow.call", call)
+
+    assert result == 2
+    assert time.monotonic() - start < 0.4
+    assert tracker.hedges["slow.call"] == 1
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_enough_samples(tracker):
+    result = await hedged_call("new.call", lambda: "ok")
+
+    assert result == "ok"
+    assert tracker.hedges.get("new.call", 0) == 0
+    assert tracker.hedge_delay("new.call") is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded(tracker):
+    token = deadline_service.set_deadline(0.05)
+    try:
+        with pytest.raises(DeadlineExceeded):
+            await hedged_call("new.call", lambda: time.sleep(0.3))
+        with pytest.raises(DeadlineExceeded):
+            await hedged_call("new.call", lambda: "too late")
+    finally:
+        deadline_service.reset_deadline(token)
+
+    assert deadline_service.remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate(tracker):
+    def call():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        await hedged_call("slow.call", call)
+
+
+def test_hedges_are_capped():
+    tracker = LatencyTracker(window=10, min_samples=1, max_hedge_ratio=0.1)
+    for _ in range(10):
+        tracker.start_call("call")
+
+    assert tracker.try_hedge("call") is True
+    assert tracker.try_hedge("call") is False
+
+
+def test_budget_header_can_only_shorten_the_budget():
+    default = deadline_service.settings.REQUEST_BUDGET_SECONDS
+    assert deadline_service.parse_budget_header(b"1500") == 1.5
+    assert deadline_service.parse_budget_header(str(int(default * 1000) + 1).encode()) == default
+    assert deadline_service.parse_budget_header(b"0") == default
+    assert deadline_service.parse_budget_header(b"-200") == default
+    assert deadline_service.parse_budget_header(b"soon") == default
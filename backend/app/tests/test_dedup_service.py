@@ -0,0 +1,79 @@
+from unittest.mock import patch
+from app.services import dedup_service
+
+GITHUB_TEMPLATE = (
+    "Hi octocat, a new issue #{n} was opened in acme/widgets by {author}. "
+    "View it on GitHub: https://github.com/acme/widgets/issues/{n} "
+    "You are receiving this because you are subscribed to this thread."
+)
+
+GITHUB_EMAILS = [
+    {"id": f"gh{n}", "sender": "GitHub <notifications@github.com>", "subject": f"[acme/widgets] Issue #{n}", "body": GITHUB_TEMPLATE.format(n=n, author=author)}
+    for n, author in ((101, "alice"), (202, "bob"), (303, "carol"))
+]
+
+INVOICE_EMAIL = {
+    "id": "inv1",
+    "sender": "Billing <billing@vendor.com>",
+    "subject": "Invoice 789 due",
+    "body": "Your invoice for November is attached. Payment is due within thirty days of receipt. Contact us with any questions."
+}
+
+
+def test_templated_notifications_cluster_together():
+    emails = [GITHUB_EMAILS[0], INVOICE_EMAIL, GITHUB_EMAILS[1], GITHUB_EMAILS[2]]
+    clusters = dedup_service.cluster_fingerprints(dedup_service.fingerprint_emails(emails))
+
+    assert clusters == [[0, 2, 3], [1]]
+    groups = dedup_service.describe_groups(emails, clusters)
+    assert groups == [{
+        "representative_id": "gh101",
+        "email_ids": ["gh101", "gh202", "gh303"],
+        "count": 3,
+        "label": "3 similar emails from GitHub",
+        "details_differ": True
+    }]
+
+
+def test_short_emails_are_never_grouped():
+    emails = [{"id": "a", "subject": "", "body": "Thanks!"}, {"id": "b", "subject": "", "body": "Thanks!"}]
+    fingerprints = dedup_service.fingerprint_emails(emails)
+
+    assert fingerprints == [None, None]
+    assert dedup_service.cluster_fingerprints(fingerprints) == [[0], [1]]
+
+
+DECISION_TEMPLATE = (
+    "Hello {name}, thank you for submitting your expense report for the October offsite in Lisbon. "
+    "After review by the finance team, your request has been {decision}. You can see the full details "
+    "of the decision in the expenses portal under your reports tab. If you have any questions about this "
+    "outcome please reply to this message and a member of the finance team will follow up with you shortly."
+)
+
+
+def decision_email(i, name="Alice Johnson", decision="approved"):
+    return {"id": f"dec{i}", "sender": "Finance <finance@acme.example>", "subject": "Expense report decision",
+            "body": DECISION_TEMPLATE.format(name=name, decision=decision)}
+
+
+def test_changed_words_cluster_but_keep_distinct_content_keys():
+    """'approved' vs 'rejected', or another name, is a near-duplicate but never the same content."""
+    for other in (decision_email(1, decision="rejected"), decision_email(1, name="Robert Smith")):
+        emails = [decision_email(0), other]
+        assert dedup_service.cluster_fingerprints(dedup_service.fingerprint_emails(emails)) == [[0, 1]]
+        keys = dedup_service.content_keys(emails)
+        assert keys[0] != keys[1]
+
+    same = dedup_service.content_keys([decision_email(0), {**decision_email(2), "body": "  " + DECISION_TEMPLATE.format(name="Alice Johnson", decision="approved").upper()}])
+    assert same[0] == same[1]
+
+
+def test_recent_summary_is_reused_only_for_identical_content():
+    approved, rejected = dedup_service.content_keys([decision_email(0), decision_email(1, decision="rejected")])
+
+    with patch.dict(dedup_service._recent_summaries, clear=True):
+        dedup_service.remember_summary("user", approved, "Alice's expense report was approved.")
+
+        assert dedup_service.recent_summary("user", approved) == "Alice's expense report was approved."
+        assert dedup_service.recent_summary("user", rejected) is None
+        assert dedup_service.recent_summary("other", approved) is None
@@ -1,7 +1,9 @@
 import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 from google.oauth2.credentials import Credentials
-from app.services.gmail_service import fetch_latest_emails
+from app.services import gmail_service
+from app.services.gmail_service import fetch_latest_emails, send_prepared_reply
+import threading
 import base64
 import asyncio
 
@@ -97,4 +99,32 @@ async def test_fetch_latest_emails_parsing(mock_build, mock_credentials):
     assert email['subject'] == 'Invoice 789 Due'
     assert email['sender'] == 'John Doe <john.doe@example.com>'
     assert email['snippet'] == 'This is a short snippet...'
-    assert email['body'] == MOCK_EMAIL_BODY_CONTENT # Crucial: Check if decoding worked
\ No newline at end of file
+    assert email['body'] == MOCK_EMAIL_BODY_CONTENT # Crucial: Check if decoding worked
+
+
+@patch('app.services.gmail_service.build')
+@pytest.mark.asyncio
+async def test_send_prepared_reply_runs_off_the_event_loop(mock_build, mock_credentials):
+    """The outbox sender runs in every worker, so the blocking send must not stall the loop."""
+    loop_thread = threading.get_ident()
+    send_threads = []
+
+    def execute(http=None):
+        send_threads.append(threading.get_ident())
+        return {'id': 'sent_id_1'}
+
+    mock_build.return_value.users.return_value.messages.return_value.send.return_value.execute.side_effect = execute
+    metadata = {"recipient": "john.doe@example.com", "subject": "Re: Invoice 789 Due", "thread_id": "t1", "message_id": None}
+
+    assert await send_prepared_reply(mock_credentials, metadata, "Paid today.") == 'sent_id_1'
+    assert send_threads and send_threads[0] != loop_thread
+
+
+def test_reply_metadata_cache_is_per_user():
+    email = {"id": "shared_id", "sender": "John Doe <john.doe@example.com>", "subject": "Invoice 789 Due", "thread_id": "t1"}
+    with patch.dict(gmail_service._reply_metadata_cache, clear=True):
+        gmail_service.remember_reply_metadata("alice@example.com", [email, {"id": "x", "sender": "Unknown Sender"}])
+
+        assert gmail_service.get_cached_reply_metadata("alice@example.com", "shared_id")["recipient"] == "john.doe@example.com"
+        assert gmail_service.get_cached_reply_metadata("bob@example.com", "shared_id") is None
+        assert gmail_service.get_cached_reply_metadata("alice@example.com", "x") is None
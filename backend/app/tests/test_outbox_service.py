@@ -0,0 +1,155 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.services import outbox_service
+
+MOCK_METADATA = {
+    "recipient": "john.doe@example.com",
+    "subject": "Re: Invoice 789 Due",
+    "thread_id": "mock_thread_id_456",
+    "message_id": None
+}
+
+
+@pytest.fixture
+def mock_db():
+    """A db whose outbox collection is an AsyncMock."""
+    collection = MagicMock()
+    collection.insert_one = AsyncMock()
+    collection.find_one = AsyncMock()
+    collection.update_one = AsyncMock()
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    return db, collection
+
+
+def make_entry(status="queued", attempts=0):
+    return {
+        "_id": "outbox123",
+        "user_id": "test@example.com",
+        "session_id": "session123",
+        "email_id": "mock_msg_id_123",
+        "reply_body": "Thanks, paid today.",
+        "metadata": MOCK_METADATA,
+        "message_id": "<outbox123@swiftmail>",
+        "status": status,
+        "attempts": attempts
+    }
+
+
+@pytest.mark.asyncio
+async def test_enqueue_same_reply_is_deduplicated(mock_db):
+    db, collection = mock_db
+    first = await outbox_service.enqueue_reply(db, "u", "s", "mock_msg_id_123", "Thanks!", MOCK_METADATA)
+
+    collection.insert_one.side_effect = DuplicateKeyError("duplicate")
+    collection.find_one.return_value = {"_id": first["outbox_id"], "status": "sent", "attempts": 1}
+    second = await outbox_service.enqueue_reply(db, "u", "s", "mock_msg_id_123", "Thanks!", MOCK_METADATA)
+
+    assert second["outbox_id"] == first["outbox_id"]
+    assert second["status"] == "sent"
+
+
+@pytest.mark.asyncio
+@patch('app.services.outbox_service.gmail_service')
+@patch('app.services.outbox_service.auth_service')
+async def test_process_entry_sends_and_marks_sent(mock_auth, mock_gmail, mock_db):
+    db, collection = mock_db
+    mock_auth.load_and_refresh_tokens_from_db = AsyncMock(return_value=(object(), "Test User"))
+    mock_gmail.send_prepared_reply = AsyncMock(return_value="sent_id_1")
+    mock_gmail.find_sent_message = AsyncMock()
+
+    await outbox_service.process_entry(db, make_entry())
+
+    mock_gmail.find_sent_message.assert_not_called()
+    mock_gmail.send_prepared_reply.assert_called_once()
+    update = collection.update_one.call_args.args[1]["$set"]
+    assert update["status"] == "sent"
+    assert update["gmail_message_id"] == "sent_id_1"
+
+
+@pytest.mark.asyncio
+@patch('app.services.outbox_service.gmail_service')
+@patch('app.services.outbox_service.auth_service')
+async def test_interrupted_send_is_not_repeated(mock_auth, mock_gmail, mock_db):
+    """An expired 'sending' lease whose message is already in Sent is marked sent without resending."""
+    db, collection = mock_db
+    mock_auth.load_and_refresh_tokens_from_db = AsyncMock(return_value=(object(), "Test User"))
+    mock_gmail.find_sent_message = AsyncMock(return_value="sent_id_1")
+    mock_gmail.send_prepared_reply = AsyncMock()
+
+    await outbox_service.process_entry(db, make_entry(status="sending", attempts=1))
+
+    mock_gmail.send_prepared_reply.assert_not_called()
+    assert collection.update_one.call_args.args[1]["$set"]["status"] == "sent"
+
+
+@pytest.mark.asyncio
+@patch('app.services.outbox_service.gmail_service')
+@patch('app.services.outbox_service.auth_service')
+async def test_failed_send_is_retried_then_given_up(mock_auth, mock_gmail, mock_db):
+    db, collection = mock_db
+    mock_auth.load_and_refresh_tokens_from_db = AsyncMock(return_value=(object(), "Test User"))
+    mock_gmail.send_prepared_reply = AsyncMock(side_effect=Exception("timeout"))
+    mock_gmail.find_sent_message = AsyncMock(return_value=None)
+
+    await outbox_service.process_entry(db, make_entry(attempts=0))
+    update = collection.update_one.call_args.args[1]["$set"]
+    assert update["status"] == "queued"
+    assert update["last_error"] == "timeout"
+
+    await outbox_service.process_entry(db, make_entry(attempts=settings.OUTBOX_MAX_ATTEMPTS - 1))
+    assert collection.update_one.call_args.args[1]["$set"]["status"] == "failed"
+
+
+@pytest.mark.asyncio
+@patch('app.services.outbox_service.gmail_service')
+@patch('app.services.outbox_service.auth_service')
+async def test_retry_after_failed_send_checks_sent_folder(mock_auth, mock_gmail, mock_db):
+    """A send that errored after Gmail accepted it (e.g. a timeout) is found in Sent, not sent again."""
+    db, collection = mock_db
+    mock_auth.load_and_refresh_tokens_from_db = AsyncMock(return_value=(object(), "Test User"))
+    mock_gmail.find_sent_message = AsyncMock(return_value="sent_id_1")
+    mock_gmail.send_prepared_reply = AsyncMock(side_effect=Exception("timeout"))
+
+    entry = make_entry(attempts=0)
+    await outbox_service.process_entry(db, entry)
+    mock_gmail.find_sent_message.assert_not_called()
+    assert collection.update_one.call_args.args[1]["$set"]["status"] == "queued"
+
+    await outbox_service.process_entry(db, {**entry, "attempts": 1})
+    mock_gmail.find_sent_message.assert_called_once_with(mock_auth.load_and_refresh_tokens_from_db.return_value[0], entry["message_id"])
+    assert mock_gmail.send_prepared_reply.call_count == 1
+    update = collection.update_one.call_args.args[1]["$set"]
+    assert update["status"] == "sent"
+    assert update["gmail_message_id"] == "sent_id_1"
+
+
+@pytest.mark.asyncio
+@patch('app.services.outbox_service.gmail_service')
+@patch('app.services.outbox_service.auth_service')
+async def test_missing_metadata_is_resolved_before_sending(mock_auth, mock_gmail, mock_db):
+    db, collection = mock_db
+    mock_auth.load_and_refresh_tokens_from_db = AsyncMock(return_value=(object(), "Test User"))
+    mock_gmail.get_reply_metadata = AsyncMock(return_value=MOCK_METADATA)
+    mock_gmail.send_prepared_reply = AsyncMock(return_value="sent_id_1")
+
+    await outbox_service.process_entry(db, {**make_entry(), "metadata": None})
+
+    mock_gmail.get_reply_metadata.assert_called_once_with(
+        mock_auth.load_and_refresh_tokens_from_db.return_value[0], "test@example.com", "mock_msg_id_123"
+    )
+    assert mock_gmail.send_prepared_reply.call_args.args[1] == MOCK_METADATA
+    assert collection.update_one.call_args_list[0].args[1] == {"$set": {"metadata": MOCK_METADATA}}
+    assert collection.update_one.call_args.args[1]["$set"]["status"] == "sent"
+
+    mock_gmail.get_reply_metadata.return_value = None
+    await outbox_service.process_entry(db, {**make_entry(), "metadata": None})
+    assert collection.update_one.call_args.args[1]["$set"]["status"] == "failed"
+
+
+def test_backoff_delay_grows_and_is_capped():
+    assert outbox_service.backoff_delay(1) <= settings.OUTBOX_BACKOFF_BASE_SECONDS
+    assert outbox_service.backoff_delay(4) >= settings.OUTBOX_BACKOFF_BASE_SECONDS * 4
+    assert outbox_service.backoff_delay(50) <= settings.OUTBOX_BACKOFF_MAX_SECONDS
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routers import admin
+from app.services import profiling_service
+from app.services.profiling_service import LoopBlockMonitor, ProfilingMiddleware, StackSampler
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret-admin-token"}
+
+
+@pytest.fixture
+def profiling_settings(tmp_path):
+    with patch.object(profiling_service.settings, 'ADMIN_TOKEN', "secret-admin-token"), \
+            patch.object(profiling_service.settings, 'PROFILE_DIR', str(tmp_path)):
+        yield tmp_path
+
+
+@pytest.fixture
+def client(profiling_settings):
+    """A minimal app with the profiling middleware and admin router."""
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(admin.router)
+
+    @app.get("/work")
+    def work():
+        return {"total": sum(range(10000))}
+
+    return TestClient(app)
+
+
+def test_request_profile_requires_admin_token(client):
+    response = client.get("/work?profile=1")
+    assert "x-profile-id" not in response.headers
+
+    response = client.get("/work?profile=1", headers={"X-Admin-Token": "wrong"})
+    assert "x-profile-id" not in response.headers
+
+
+def test_request_profile_is_downloadable(client):
+    response = client.get("/work", headers={**ADMIN_HEADERS, "X-Profile": "1"})
+    name = response.headers["x-profile-id"]
+
+    listed = client.get("/api/admin/profiling/profiles", headers=ADMIN_HEADERS).json()["profiles"]
+    assert [entry["name"] for entry in listed] == [name]
+
+    text = client.get(f"/api/admin/profiling/profiles/{name}?format=text", headers=ADMIN_HEADERS).text
+    assert "function calls" in text
+
+
+def test_admin_endpoints_hidden_without_token(client):
+    assert client.get("/api/admin/profiling/profiles").status_code == 404
+    assert client.get("/api/admin/profiling/profiles/../../etc/passwd", headers=ADMIN_HEADERS).status_code == 404
+
+
+def test_stack_sampler_writes_collapsed_stacks(profiling_settings):
+    sampler = StackSampler()
+    assert sampler.start(duration=5, interval=0.005)
+    assert not sampler.start(duration=5, interval=0.005)
+    time.sleep(0.1)
+    sampler.stop()
+
+    status = sampler.status()
+    assert status["samples"] > 0
+    lines = (profiling_settings / status["output"]).read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(line.startswith("MainThread;") for line in lines)
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_captures_blocking_stack():
+    monitor = LoopBlockMonitor(threshold_ms=50)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    blocking_call()
+    await asyncio.sleep(0.05)
+    monitor.stop()
+
+    events = monitor.status()["events"]
+    assert len(events) == 1
+    assert events[0]["blocked_ms"] >= 50
+    assert any("blocking_call" in line for line in events[0]["stack"])
@@ -0,0 +1,101 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+from app.services import search_service
+from app.services.search_service import MailboxIndex
+
+DIMENSIONS = 8
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index(tmp_path):
+    """A fresh on-disk index under a temporary VECTOR_INDEX_DIR."""
+    with patch.object(search_service.settings, 'VECTOR_INDEX_DIR', str(tmp_path)):
+        yield MailboxIndex("test@example.com", dimensions=DIMENSIONS)
+
+
+def test_search_returns_nearest_first(index):
+    eye = np.eye(DIMENSIONS)
+    # 'a' leans towards the query axis, so it ranks between 'b' (on it) and 'c' (orthogonal).
+    vectors = np.stack([unit(eye[0] + 0.5 * eye[1]), unit(eye[1] + 0.1), unit(eye[2] + 0.1)])
+    index.add(["a", "b", "c"], vectors, ["Alice <a@x.com>", "Bob <b@x.com>", "Alice <a@x.com>"], [1000, 2000, 3000])
+
+    results = index.search(unit(eye[1]), top_k=2)
+
+    assert [email_id for email_id, _ in results] == ["b", "a"]
+    assert results[0][1] > results[1][1]
+
+
+def test_search_filters_by_sender_and_date(index):
+    vectors = np.stack([unit(np.ones(DIMENSIONS))] * 3)
+    index.add(["a", "b", "c"], vectors, ["Alice <a@x.com>", "Bob <b@x.com>", "Alice <a@x.com>"], [1000, 2000, 3000])
+    query = unit(np.ones(DIMENSIONS))
+
+    assert {email_id for email_id, _ in index.search(query, top_k=5, sender="alice")} == {"a", "c"}
+    assert [email_id for email_id, _ in index.search(query, top_k=5, sender="ALICE", after=2000)] == ["c"]
+    assert index.search(query, top_k=5, sender="carol") == []
+
+
+def test_add_skips_indexed_ids_and_reloads_from_disk(index):
+    vectors = np.stack([unit(np.ones(DIMENSIONS))] * 2)
+    index.add(["a", "b"], vectors, ["x", "y"], [0, 0])
+    index.add(["b", "c"], vectors, ["y", "z"], [0, 0], ["Re: y", "Hello"])
+
+    # A second instance (e.g. another worker) sees the same rows.
+    reloaded = MailboxIndex("test@example.com", dimensions=DIMENSIONS)
+    reloaded.path, reloaded.vectors_path, reloaded.meta_path = index.path, index.vectors_path, index.meta_path
+
+    assert reloaded.missing_ids(["a", "b", "c", "d"]) == ["d"]
+    assert reloaded.describe("a") == {"sender": "x", "subject": ""}
+    assert reloaded.describe("c") == {"sender": "z", "subject": "Hello"}
+    assert len(reloaded.search(unit(np.ones(DIMENSIONS)), top_k=10)) == 3
+
+
+def test_search_50k_index_is_fast(tmp_path):
+    """Nearest-neighbour queries over 50k messages should take a few milliseconds."""
+    with patch.object(search_service.settings, 'VECTOR_INDEX_DIR', str(tmp_path)):
+        large = MailboxIndex("large@example.com", dimensions=256)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((50_000, 256)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"msg{i}" for i in range(50_000)]
+    large.add(ids, vectors, [f"sender{i % 500}@example.com" for i in range(50_000)], list(range(50_000)))
+
+    large.search(vectors[0], top_k=5)  # Warm the metadata arrays and page cache.
+    start = time.perf_counter()
+    for _ in range(20):
+        results = large.search(vectors[123], top_k=5, sender="sender123@", after=100)
+    elapsed = (time.perf_counter() - start) / 20
+
+    assert results[0][0] == "msg123"
+    assert elapsed < 0.05
+
+
+@pytest.mark.asyncio
+async def test_query_embedding_goes_through_interactive_lane(index):
+    """Semantic search embeds the query under the scheduler, like every other Gemini call."""
+    from app.services import ai_service
+    from app.services.llm_scheduler import LLMScheduler
+
+    eye = np.eye(DIMENSIONS)
+    index.add(["a", "b"], np.stack([unit(eye[0]), unit(eye[1])]), ["x", "y"], [0, 0])
+    scheduler = LLMScheduler(2, {"interactive": 2, "bulk": 2})
+
+    with patch.object(search_service, 'get_index', return_value=index), \
+            patch.object(ai_service, 'llm_scheduler', scheduler), \
+            patch.object(ai_service, 'client') as mock_client, \
+            patch.object(ai_service.settings, 'EMBEDDING_DIMENSIONS', DIMENSIONS):
+        mock_client.models.embed_content.return_value = MagicMock(embeddings=[MagicMock(values=eye[1].tolist())])
+        results = await search_service.semantic_search("test@example.com", "the y email")
+
+    assert [email_id for email_id, _ in results] == ["b"]
+    assert scheduler.get_metrics()["interactive"]["dispatched"] == 1
+    await asyncio.sleep(0.05)  # Slots are released from task callbacks.
+    assert scheduler.running == 0
@@ -0,0 +1,133 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.models.chat import ActionConfirmationRequest
+from app.routers.chat import find_target_email_id, semantic_match_text, send_email_reply
+from app.services import ai_service, session_cache_service
+
+
+@pytest.fixture
+def mock_db():
+    collection = MagicMock()
+    collection.find_one = AsyncMock()
+    collection.replace_one = AsyncMock()
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    return db, collection
+
+
+@pytest.mark.asyncio
+async def test_save_listing_keeps_only_listing_fields(mock_db):
+    db, collection = mock_db
+    emails = [{"id": f"id{i}", "sender": "a@x.com", "subject": "s", "thread_id": "t", "body": "long body"} for i in range(80)]
+
+    await session_cache_service.save_listing(db, "session123", emails)
+
+    saved = collection.replace_one.call_args.args[1]
+    assert len(saved["emails"]) == session_cache_service.settings.SESSION_CACHE_MAX_EMAILS
+    assert saved["emails"][0] == {"id": "id0", "sender": "a@x.com", "subject": "s", "thread_id": "t", "message_id": None}
+
+
+@pytest.mark.asyncio
+async def test_get_listed_email_fetches_one_slot(mock_db):
+    db, collection = mock_db
+    collection.find_one.return_value = {"_id": "session123", "emails": [{"id": "id2"}]}
+
+    assert await session_cache_service.get_listed_email(db, "session123", 3) == {"id": "id2"}
+    assert collection.find_one.call_args.args[1] == {"emails": {"$slice": [2, 1]}}
+
+    collection.find_one.return_value = None
+    assert await session_cache_service.get_listed_email(db, "session123", 3) is None
+    assert await session_cache_service.get_listed_email(db, "session123", 0) is None
+
+
+@pytest.mark.asyncio
+@patch('app.routers.chat.gmail_service')
+@patch('app.routers.chat.session_cache_service')
+async def test_email_number_resolves_without_gmail(mock_cache, mock_gmail):
+    """'Delete email 2' uses the cached listing and never searches Gmail."""
+    mock_cache.get_listed_email = AsyncMock(return_value={"id": "listed_id_2"})
+    mock_gmail.find_email_id_by_query = AsyncMock()
+
+    email_id, match = await find_target_email_id(
+        object(), {"email_number": 2, "sender": "John"}, db=MagicMock(), session_id="session123"
+    )
+
+    assert email_id == "listed_id_2"
+    assert match is None
+    mock_gmail.find_email_id_by_query.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch('app.services.ai_service.client')
+@patch('app.routers.chat.gmail_service')
+@patch('app.routers.chat.session_cache_service')
+async def test_flat_intent_email_number_reaches_cache(mock_cache, mock_gmail, mock_client):
+    """The intent schema is flat; 'email_number' must still reach the cached listing."""
+    mock_client.models.generate_content.return_value = MagicMock(
+        text='{"action": "delete", "email_number": 2, "sender": null}'
+    )
+    mock_cache.get_listed_email = AsyncMock(return_value={"id": "listed_id_2"})
+    mock_gmail.find_email_id_by_query = AsyncMock()
+
+    intent = await ai_service.parse_user_intent("Delete email 2")
+    email_id, _ = await find_target_email_id(object(), intent["params"], db=MagicMock(), session_id="session123")
+
+    assert intent == {"action": "delete", "params": {"email_number": 2}}
+    assert email_id == "listed_id_2"
+    assert mock_cache.get_listed_email.call_args.args[1:] == ("session123", 2)
+    mock_gmail.find_email_id_by_query.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch('app.services.ai_service.client')
+@patch('app.routers.chat.search_service')
+async def test_flat_intent_within_days_filters_semantic_search(mock_search, mock_client):
+    """'within_days' from the flat schema becomes the semantic search's 'after' bound."""
+    mock_client.models.generate_content.return_value = MagicMock(
+        text='{"action": "delete", "within_days": 7}'
+    )
+    mock_search.semantic_search = AsyncMock(return_value=[("semantic_id", 0.8)])
+    mock_search.get_index.return_value.describe.return_value = {"sender": "Billing <b@x.com>", "subject": "Invoice 42"}
+
+    intent = await ai_service.parse_user_intent("Delete the invoice email from last week")
+    email_id, match = await find_target_email_id(object(), intent["params"], "user123", "Delete the invoice email from last week")
+
+    assert email_id == "semantic_id"
+    # A semantic hit is a best guess; the confirmation names it.
+    assert "Billing <b@x.com>" in semantic_match_text(match) and "Invoice 42" in semantic_match_text(match)
+    after = mock_search.semantic_search.call_args.kwargs["after"]
+    assert after == pytest.approx((time.time() - 7 * 86400) * 1000, abs=60_000)
+
+
+@pytest.mark.asyncio
+async def test_get_listed_email_by_id_projects_one_email(mock_db):
+    db, collection = mock_db
+    collection.find_one.return_value = {"_id": "session123", "emails": [{"id": "id7", "sender": "a@x.com"}]}
+
+    assert await session_cache_service.get_listed_email_by_id(db, "session123", "id7") == {"id": "id7", "sender": "a@x.com"}
+    assert collection.find_one.call_args.args[0]["emails.id"] == "id7"
+    assert collection.find_one.call_args.args[1] == {"emails.$": 1}
+
+
+@pytest.mark.asyncio
+@patch('app.routers.chat.outbox_service')
+@patch('app.routers.chat.session_cache_service')
+async def test_send_reply_uses_listing_metadata_without_gmail(mock_cache, mock_outbox):
+    """A reply confirmed on a worker that never fetched the email is enqueued from the session listing."""
+    mock_cache.get_listed_email_by_id = AsyncMock(return_value={
+        "id": "listed_id_2", "sender": "John Doe <john.doe@example.com>", "subject": "Invoice",
+        "thread_id": "t2", "message_id": "<orig@example.com>"
+    })
+    mock_outbox.enqueue_reply = AsyncMock(return_value={"outbox_id": "o1", "status": "queued"})
+
+    with patch('app.services.gmail_service.build') as mock_build:
+        result = await send_email_reply(
+            MagicMock(), ActionConfirmationRequest(email_id="listed_id_2", reply_body="Paid."),
+            creds_tuple=(object(), "Test User"), user_id="test@example.com", session_id="session123", idempotency_key="k1"
+        )
+
+    mock_build.assert_not_called()
+    metadata = mock_outbox.enqueue_reply.call_args.args[5]
+    assert metadata == {"recipient": "john.doe@example.com", "subject": "Re: Invoice", "thread_id": "t2", "message_id": "<orig@example.com>"}
+    assert result["data"]["status"] == "queued"
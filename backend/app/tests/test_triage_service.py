@@ -0,0 +1,49 @@
+from unittest.mock import patch
+import numpy as np
+from app.services import triage_service
+
+
+def make_email(i, **overrides):
+    return {"id": f"msg_{i}", "sender": f"Person {i} <person{i}@example.com>", "subject": "Hello", "snippet": "", **overrides}
+
+
+def test_feature_matrix_columns():
+    emails = [
+        make_email(0, labels=["IMPORTANT", "UNREAD"], subject="Urgent: invoice overdue"),
+        make_email(1, sender="Shop <no-reply@shop.example>", labels=["CATEGORY_PROMOTIONS"],
+                   list_unsubscribe=True, precedence="bulk"),
+    ]
+    matrix = triage_service.feature_matrix(emails, {"person0@example.com"}, {"shop <no-reply@shop.example>": 500})
+    row = dict(zip(triage_service.FEATURE_NAMES, matrix[0]))
+    bulk = dict(zip(triage_service.FEATURE_NAMES, matrix[1]))
+
+    assert matrix.shape == (2, len(triage_service.FEATURES))
+    assert row["important"] == row["unread"] == row["replied_before"] == 1
+    assert np.isclose(row["urgent_keywords"], 1.0)
+    assert bulk["frequent_sender"] == 1
+    assert bulk["promotions_social"] == bulk["list_unsubscribe"] == bulk["bulk_precedence"] == bulk["no_reply_sender"] == 1
+
+
+def test_scores_rank_and_explain():
+    emails = [
+        make_email(0, labels=["CATEGORY_PROMOTIONS"], list_unsubscribe=True),
+        make_email(1),
+        make_email(2, labels=["STARRED"]),
+    ]
+    with patch.dict(triage_service._score_cache, clear=True):
+        triage = triage_service.score_emails("user", emails, set(), {})
+
+    assert [t["score"] for t in triage] == [-2.5, 0.0, 2.0]
+    assert triage_service.rank(triage) == [2, 1, 0]
+    assert triage[0]["reasons"] == ["Promotions or social category (-1.50)", "Mailing list (has List-Unsubscribe) (-1.00)"]
+    assert triage[1]["reasons"] == []
+
+
+def test_scores_are_cached_per_message():
+    emails = [make_email(0, labels=["IMPORTANT"])]
+    with patch.dict(triage_service._score_cache, clear=True):
+        first = triage_service.score_emails("user", emails, set(), {})
+        with patch.object(triage_service, "feature_matrix") as feature_matrix:
+            second = triage_service.score_emails("user", emails, set(), {})
+        feature_matrix.assert_not_called()
+    assert first == second
@@ -9,8 +9,15 @@ const API = axios.create({
   withCredentials: true, // Important for session cookies
 });
 
+// Read results only carry what the list view shows; bodies are fetched on demand.
+const READ_RESULT_FIELDS = ["id", "sender", "subject", "summary", "triage"];
+
 export const processCommand = (command) => {
-  return API.post("/chat/command", { command });
+  return API.post("/chat/command", { command, fields: READ_RESULT_FIELDS });
+};
+
+export const getEmailContent = (emailId) => {
+  return API.get(`/chat/emails/${emailId}`);
 };
 
 // NEW EXPORT
@@ -18,12 +25,22 @@ export const suggestReply = (emailId) => {
   return API.post("/chat/suggest-reply", { email_id: emailId });
 };
 
-export const sendReplyConfirmation = (emailId, replyBody) => {
+// idempotencyKey identifies one draft: every click and retry for it is sent once, while a
+// new draft (even with identical text) gets a new key and is sent again.
+export const sendReplyConfirmation = (emailId, replyBody, idempotencyKey) => {
   // Note: API uses 'email_id' and 'reply_body'
-  return API.post("/chat/send-reply", {
-    email_id: emailId,
-    reply_body: replyBody,
-  });
+  return API.post(
+    "/chat/send-reply",
+    {
+      email_id: emailId,
+      reply_body: replyBody,
+    },
+    { headers: { "Idempotency-Key": idempotencyKey } }
+  );
+};
+
+export const getReplyStatus = (outboxId) => {
+  return API.get(`/chat/send-reply/${outboxId}`);
 };
 
 export const deleteEmailConfirmation = (emailId) => {
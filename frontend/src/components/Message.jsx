@@ -1,8 +1,10 @@
-import React from "react";
-import { suggestReply } from "../api/chatApi";
+import React, { useState } from "react";
+import { suggestReply, getEmailContent } from "../api/chatApi";
 
 const Message = ({ sender, text, isSystem, data, action, onAction }) => {
   const isAI = sender === "AI" || isSystem;
+  // Read results are summary-only; full bodies are fetched when opened.
+  const [openBodies, setOpenBodies] = useState({});
 
   const messageContainerClass = isAI
     ? "flex justify-start mb-4"
@@ -40,6 +42,32 @@ const Message = ({ sender, text, isSystem, data, action, onAction }) => {
     }
   };
 
+  const handleToggleBody = async (emailId) => {
+    if (openBodies[emailId] !== undefined) {
+      setOpenBodies((prev) => {
+        const next = { ...prev };
+        delete next[emailId];
+        return next;
+      });
+      return;
+    }
+    setOpenBodies((prev) => ({ ...prev, [emailId]: null }));
+    try {
+      const response = await getEmailContent(emailId);
+      setOpenBodies((prev) => ({
+        ...prev,
+        [emailId]: response.data.body || response.data.snippet || "",
+      }));
+    } catch (error) {
+      setOpenBodies((prev) => ({
+        ...prev,
+        [emailId]: `Could not load this email: ${
+          error.response?.data?.detail || "Server error"
+        }`,
+      }));
+    }
+  };
+
   const handlePreDelete = (emailId) => {
     onAction("pre_delete", { email_id: emailId });
   };
@@ -82,9 +110,10 @@ const Message = ({ sender, text, isSystem, data, action, onAction }) => {
           <p className="font-semibold mb-3">Ready to send this AI draft?</p>
           <button
             onClick={() => onAction("confirm_send", data)}
-            className="text-xs bg-blue-600 hover:bg-blue-700 text-white font-medium py-1.5 px-3 rounded-lg transition"
+            disabled={data.accepted}
+            className="text-xs bg-blue-600 hover:bg-blue-700 disabled:bg-gray-400 disabled:cursor-not-allowed text-white font-medium py-1.5 px-3 rounded-lg transition"
           >
-            Yes, Send
+            {data.accepted ? "Queued" : "Yes, Send"}
           </button>
         </div>
       );
@@ -92,11 +121,22 @@ const Message = ({ sender, text, isSystem, data, action, onAction }) => {
     return null;
   };
 
-  const renderEmailSummaries = (emails) => (
+  const renderEmailSummaries = (emails, groups = []) => (
     <div className="mt-4 p-4 bg-white/60 backdrop-blur-sm rounded-2xl border border-gray-200 shadow-inner">
       <h3 className="text-lg font-semibold mb-4 text-gray-800">
         Fetched Emails
       </h3>
+      {groups.map((group) => (
+        <p
+          key={group.representative_id}
+          className="text-xs text-gray-600 bg-gray-200 rounded-lg px-3 py-1.5 mb-3"
+        >
+          {group.label}{" "}
+          {group.details_differ
+            ? "(only identical emails share a summary; the rest show their own snippet)"
+            : "(summarized once)"}
+        </p>
+      ))}
       {emails.map((email, i) => (
         <div
           key={email.id}
@@ -112,9 +152,33 @@ const Message = ({ sender, text, isSystem, data, action, onAction }) => {
             <span className="font-medium">Subject:</span> {email.subject}
           </p>
           <div className="bg-green-100 p-3 rounded-lg text-sm text-green-800 mb-3">
-            <span className="font-semibold">Summary:</span> {email.summary}
+            <span className="font-semibold">
+              {email.triage && !email.triage.summarized ? "Snippet:" : "Summary:"}
+            </span>{" "}
+            {email.summary}
           </div>
+          {email.triage?.reasons?.length > 0 && (
+            <p className="text-xs text-gray-500 mb-3">
+              <span className="font-medium">Priority {email.triage.score}:</span>{" "}
+              {email.triage.reasons.join(" · ")}
+            </p>
+          )}
+          {openBodies[email.id] !== undefined && (
+            <pre className="whitespace-pre-wrap bg-white border border-gray-200 p-3 rounded-lg text-xs text-gray-700 mb-3 max-h-80 overflow-y-auto">
+              {openBodies[email.id] === null
+                ? "Loading..."
+                : openBodies[email.id]}
+            </pre>
+          )}
           <div className="flex gap-2">
+            <button
+              onClick={() => handleToggleBody(email.id)}
+              className="text-xs bg-gray-500 hover:bg-gray-600 text-white font-medium py-1.5 px-3 rounded-lg transition"
+            >
+              {openBodies[email.id] !== undefined
+                ? "Hide full email"
+                : "Show full email"}
+            </button>
             <button
               onClick={() => handleSuggestReply(email.id)}
               className="text-xs bg-indigo-500 hover:bg-indigo-600 text-white font-medium py-1.5 px-3 rounded-lg transition"
@@ -144,7 +208,7 @@ const Message = ({ sender, text, isSystem, data, action, onAction }) => {
         />
         {action === "read_success" &&
           data?.emails &&
-          renderEmailSummaries(data.emails)}
+          renderEmailSummaries(data.emails, data.groups)}
         {renderDeleteConfirmation()}
         {renderSendConfirmation()}
       </div>
@@ -3,6 +3,7 @@ import {
   processCommand,
   getUserProfile,
   sendReplyConfirmation,
+  getReplyStatus,
   deleteEmailConfirmation,
 } from "../api/chatApi";
 import Message from "../components/Message";
@@ -12,6 +13,11 @@ const initialMessages = [
   { sender: "AI", text: "Loading profile...", isSystem: true, id: Date.now() },
 ];
 
+const REPLY_STATUS_POLL_MS = 2000;
+const REPLY_STATUS_MAX_POLLS = 90;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 const ChatbotDashboard = () => {
   const [messages, setMessages] = useState(initialMessages);
   const [loading, setLoading] = useState(false);
@@ -93,6 +99,51 @@ const ChatbotDashboard = () => {
     }
   };
 
+  // Disables the draft's send button once the server has accepted it.
+  const markDraftAccepted = (idempotencyKey) => {
+    setMessages((prev) =>
+      prev.map((msg) =>
+        msg.data?.idempotency_key === idempotencyKey
+          ? { ...msg, data: { ...msg.data, accepted: true } }
+          : msg
+      )
+    );
+  };
+
+  // The outbox sends in the background; report the final outcome once it is known.
+  const pollReplyStatus = async (entry) => {
+    let current = entry;
+    for (
+      let polls = 0;
+      current.status !== "sent" &&
+      current.status !== "failed" &&
+      polls < REPLY_STATUS_MAX_POLLS;
+      polls++
+    ) {
+      await sleep(REPLY_STATUS_POLL_MS);
+      try {
+        current = (await getReplyStatus(entry.outbox_id)).data;
+      } catch {
+        // Transient errors are retried on the next poll.
+      }
+    }
+
+    let text;
+    if (current.status === "sent") {
+      text = "Reply sent successfully.";
+    } else if (current.status === "failed") {
+      text = `Reply could not be sent: ${
+        current.last_error || "unknown error"
+      }`;
+    } else {
+      text = "The reply is still queued; it will be retried in the background.";
+    }
+    setMessages((prev) => [
+      ...prev,
+      { sender: "AI", text, isSystem: true, id: Date.now() + 8 },
+    ]);
+  };
+
   const handleAction = async (type, data) => {
     if (type === "status_update") {
       setMessages((prev) => [
@@ -115,7 +166,8 @@ const ChatbotDashboard = () => {
           text: data.text,
           isSystem: true,
           action: "confirm_send",
-          data: data.data,
+          // One key per draft: repeated clicks and retries of this draft are sent once.
+          data: { ...data.data, idempotency_key: crypto.randomUUID() },
           id: Date.now() + 5,
         },
       ]);
@@ -142,8 +194,12 @@ const ChatbotDashboard = () => {
     let successMessage;
 
     if (type === "confirm_send") {
-      apiCall = sendReplyConfirmation(data.original_email_id, data.reply_body);
-      successMessage = "Reply sent successfully.";
+      apiCall = sendReplyConfirmation(
+        data.original_email_id,
+        data.reply_body,
+        data.idempotency_key
+      );
+      successMessage = "Reply queued for sending.";
     } else if (type === "execute_delete") {
       apiCall = deleteEmailConfirmation(data.email_id);
       successMessage = "Email deleted successfully.";
@@ -163,7 +219,7 @@ const ChatbotDashboard = () => {
         },
       ]);
 
-      await apiCall;
+      const response = await apiCall;
 
       setMessages((prev) => [
         ...prev,
@@ -174,6 +230,11 @@ const ChatbotDashboard = () => {
           id: Date.now() + 7,
         },
       ]);
+
+      if (type === "confirm_send") {
+        markDraftAccepted(data.idempotency_key);
+        pollReplyStatus(response.data.data);
+      }
     } catch (error) {
       const err =
         error.response?.data?.detail || "Server error during execution.";